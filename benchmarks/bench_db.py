@@ -0,0 +1,64 @@
+"""Calls/sec of the database helpers: pooled connections vs. connect-per-call.
+
+Run from the repo root:  python benchmarks/bench_db.py [users] [calls]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+# --- Old behaviour (one connection per helper call) ---
+async def legacy_get_prefix(path, guild_id):
+    async with aiosqlite.connect(path) as db:
+        cursor = await db.execute("SELECT prefix FROM server_config WHERE guild_id = ?", (guild_id,))
+        row = await cursor.fetchone()
+        return row[0] if row else "!"
+
+async def legacy_update_presence(path, user_id, presence_type, place_id, game_id):
+    async with aiosqlite.connect(path) as db:
+        await db.execute("""
+            UPDATE tracked_users
+            SET last_presence_type = ?, last_place_id = ?, last_game_id = ?
+            WHERE user_id = ?
+        """, (presence_type, place_id, game_id, user_id))
+        await db.commit()
+
+async def timed(label, calls, fn):
+    start = time.perf_counter()
+    for i in range(calls):
+        await fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {calls / elapsed:>10.0f} calls/s")
+    return calls / elapsed
+
+async def main(users=2000, calls=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        database.pool = database.ConnectionPool(path)
+        await database.init_db()
+        for uid in range(users):
+            await database.add_user_to_track(uid, f"user{uid}", f"User {uid}")
+        await database.set_server_prefix(1, "?")
+
+        class Guild: id = 1
+        class Message: guild = Guild()
+        msg = Message()
+
+        print(f"--- {users} tracked users, {calls} calls each ---")
+        old_r = await timed("legacy get_server_prefix", calls, lambda i: legacy_get_prefix(path, 1))
+        new_r = await timed("current get_server_prefix", calls, lambda i: database.get_server_prefix(None, msg))
+        old_w = await timed("legacy update_presence_state", calls, lambda i: legacy_update_presence(path, i % users, i % 3, None, None))
+        new_w = await timed("current update_presence_state", calls, lambda i: database.update_presence_state(i % users, i % 3, None, None))
+        print(f"speedup: reads x{new_r / old_r:.1f}, writes x{new_w / old_w:.1f}")
+
+        await database.close_db()
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*args))
@@ -0,0 +1,113 @@
+"""Cost of the always-on instrumentation in utils.metrics.
+
+Times each instrumentation primitive, the full set of calls one presence tick
+makes (against the tick's own work), a request through RobloxAPI.request with
+and without its metrics against a local server, and rendering a scrape.
+
+Run from the repo root:  python benchmarks/bench_metrics.py [iterations]
+"""
+import asyncio
+import os
+import sys
+import time
+import timeit
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import roblox_api
+from utils.metrics import (LOOP_TICK, API_LATENCY, API_RESPONSES, DB_WRITE, DISCORD_SEND,
+                           DELIVERY_LAG, endpoint_of, registry)
+from benchmarks.bench_presence_diff import make_state
+from utils.presence_diff import diff_presences
+
+def per_call(label, stmt, number):
+    best = min(timeit.repeat(stmt, number=number, repeat=5)) / number
+    print(f"{label:<42} {best * 1e9:>8.0f} ns")
+    return best
+
+def tick_overhead(number):
+    # One presence tick: a 50-user batch diff plus the metric calls it triggers
+    # (loop histogram, API latency + status, one DB write, one send + lag)
+    users, presences = make_state(50)
+
+    def tick():
+        diff_presences(users, presences)
+
+    def tick_instrumented():
+        with LOOP_TICK.time("bench"):
+            diff_presences(users, presences)
+            ep = endpoint_of("presence.roblox.com", "/v1/presence/users")
+            API_LATENCY.observe(0.12, ep)
+            API_RESPONSES.inc(ep, 200)
+            DB_WRITE.observe(0.002)
+            DISCORD_SEND.observe(0.3, "channel")
+            DELIVERY_LAG.observe(1.4, "channel")
+
+    plain = min(timeit.repeat(tick, number=number, repeat=5)) / number
+    instrumented = min(timeit.repeat(tick_instrumented, number=number, repeat=5)) / number
+    print(f"{'presence tick CPU work (50 users)':<42} {plain * 1e6:>8.1f} us")
+    print(f"{'  + its metric calls':<42} {(instrumented - plain) * 1e6:>8.1f} us"
+          f"  (a real tick also waits ~100ms+ on the presence API)")
+
+async def request_overhead(count):
+    async def presence(request):
+        return web.json_response({"userPresences": []})
+
+    app = web.Application()
+    app.router.add_post("/v1/presence/users", presence)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/v1/presence/users"
+
+    roblox_api.DEFAULT_HOST_LIMIT = (1e9, 1e9) # measure the client, not the rate limiter
+    api = roblox_api.RobloxAPI()
+    saved = {name: getattr(roblox_api, name) for name in ("API_LATENCY", "API_RESPONSES", "API_DROPPED", "API_RATE_LIMITED")}
+
+    class Null:
+        def observe(self, *a, **k): pass
+        def inc(self, *a, **k): pass
+
+    async def run():
+        start = time.perf_counter()
+        for _ in range(count):
+            await api.request("POST", url, json={"userIds": [1]})
+        return (time.perf_counter() - start) / count
+
+    await run() # warm the connection pool
+    with_metrics = min([await run() for _ in range(3)])
+    for name in saved: setattr(roblox_api, name, Null())
+    without = min([await run() for _ in range(3)])
+    for name, value in saved.items(): setattr(roblox_api, name, value)
+    print(f"{'RobloxAPI.request, metrics off':<42} {without * 1e6:>8.1f} us")
+    print(f"{'RobloxAPI.request, metrics on':<42} {with_metrics * 1e6:>8.1f} us  ({100 * (with_metrics - without) / without:+.1f}%)")
+
+    await api.close()
+    await runner.cleanup()
+
+def main(number=100000):
+    print("--- per call ---")
+    per_call("Histogram.observe", lambda: API_LATENCY.observe(0.12, "x"), number)
+    def timed_block():
+        with LOOP_TICK.time("bench"): pass
+    per_call("Histogram.time (context manager)", timed_block, number)
+    per_call("Counter.inc", lambda: API_RESPONSES.inc("x", 200), number)
+    per_call("endpoint_of (cached)", lambda: endpoint_of("friends.roblox.com", "/v1/users/123/friends/count"), number)
+
+    print("--- per tick ---")
+    tick_overhead(number // 10)
+
+    print("--- per request ---")
+    asyncio.run(request_overhead(500))
+
+    # A scrape with a realistic number of series
+    for i in range(40):
+        API_LATENCY.observe(0.1, f"host{i}/v1/endpoint")
+        API_RESPONSES.inc(f"host{i}/v1/endpoint", 200)
+    per_call("registry.render (scrape)", registry.render, 200)
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,49 @@
+"""Throughput of utils.presence_diff.diff_presences on synthetic batches.
+
+Run from the repo root:  python benchmarks/bench_presence_diff.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.presence_diff import diff_presences
+
+def make_state(n, churn=0.1, seed=1):
+    rng = random.Random(seed)
+    users = {}
+    presences = []
+    for uid in range(n):
+        last = rng.randint(0, 3)
+        users[uid] = {"user_id": uid, "last_presence_type": last, "last_place_id": 1 if last == 2 else None, "last_game_id": "a" if last == 2 else None}
+        new = rng.randint(0, 3) if rng.random() < churn else last
+        presences.append({"userId": uid, "userPresenceType": new, "placeId": 1 if new == 2 else None,
+                          "gameId": "a" if new == 2 else None, "lastLocation": "Place"})
+    return users, presences
+
+def legacy_scan(users, presences):
+    # The old process_presences lookup: a linear search per presence
+    rows = list(users.values())
+    found = 0
+    for p in presences:
+        if next((u for u in rows if u['user_id'] == p['userId']), None): found += 1
+    return found
+
+def bench(n, repeat=5):
+    users, presences = make_state(n)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        transitions = diff_presences(users, presences)
+        best = min(best, time.perf_counter() - start)
+    print(f"{n:>7} users: {best * 1000:8.2f} ms  ({n / best:,.0f} users/s, {len(transitions)} transitions)")
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000):
+        bench(n)
+
+    users, presences = make_state(2_000)
+    start = time.perf_counter()
+    legacy_scan(users, presences)
+    print(f"legacy O(n^2) lookup, 2000 users: {(time.perf_counter() - start) * 1000:.2f} ms")
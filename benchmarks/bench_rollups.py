@@ -0,0 +1,91 @@
+"""Activity stats from raw presence_events vs. the daily rollup tables.
+
+Builds a synthetic history (default 2000 users x 1000 events = 2M rows over a
+year), backfills the rollups, verifies them, then times per-user stats queries
+both ways and the cost of incremental updates.
+
+Run from the repo root:  python benchmarks/bench_rollups.py [users] [events_per_user]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from utils.presence_history import build_segments, playtime
+from utils.rollups import day_of
+
+YEAR = 365 * 86400
+QUERY_USERS = 50
+
+async def populate(users, per_user, now):
+    rng = random.Random(42)
+    async with database.pool.write() as db:
+        for uid in range(users):
+            rows = []
+            for ts in sorted(rng.uniform(now - YEAR, now) for _ in range(per_user)):
+                kind = rng.choice((0, 1, 2, 2))
+                place = rng.randint(1, 200) if kind == 2 else None
+                rows.append((uid, ts, kind, place, None, f"Game {place}" if place else None))
+            await db.executemany("""
+                INSERT INTO presence_events (user_id, ts, presence_type, place_id, game_id, game_name)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+
+async def raw_stats(uid, days, now):
+    since = now - days * 86400
+    prior, events = await database.get_presence_events(uid, since, now)
+    return playtime(build_segments(prior, events, since, now))
+
+async def rollup_stats(uid, days, now):
+    totals = {}
+    for row in await database.get_activity_rollup(uid, day_of(now - (days - 1) * 86400)):
+        totals[row['presence_type']] = totals.get(row['presence_type'], 0) + row['seconds']
+    return totals
+
+async def timed(label, fn):
+    start = time.perf_counter()
+    result = await fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms")
+    return result, elapsed
+
+async def main(users=2000, per_user=1000):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.pool = database.ConnectionPool(os.path.join(tmp, "bench.db"))
+        await database.init_db()
+        now = time.time()
+
+        print(f"--- {users} users x {per_user} events = {users * per_user:,} rows ---")
+        await timed("populate presence_events", lambda: populate(users, per_user, now))
+        await timed("backfill (rebuild_rollups)", database.rebuild_rollups)
+        bad, _ = await timed("check_rollups", database.check_rollups)
+        print(f"mismatching users after rebuild: {len(bad)}")
+        await database.load_rollup_state()
+
+        sample = random.Random(7).sample(range(users), min(QUERY_USERS, users))
+        for days in (7, 30, 365):
+            async def run(fn):
+                for uid in sample: await fn(uid, days, now)
+            _, raw = await timed(f"raw stats, {days}d x{len(sample)} users", lambda: run(raw_stats))
+            _, rolled = await timed(f"rollup stats, {days}d x{len(sample)} users", lambda: run(rollup_stats))
+            print(f"  per query: raw {raw / len(sample) * 1000:.2f} ms, rollup {rolled / len(sample) * 1000:.2f} ms (x{raw / rolled:.0f})")
+
+        count = 10000
+        start = time.perf_counter()
+        for i in range(count):
+            database.writes.queue_event(i % users, now + i, i % 3, 1 if i % 3 == 2 else None, None, "Game 1")
+        queued = time.perf_counter() - start
+        await timed(f"flush {count} events + rollup deltas", database.writes.flush)
+        print(f"queue_event: {queued / count * 1e6:.1f} us/event")
+        bad, _ = await timed("check_rollups after live updates", database.check_rollups)
+        print(f"mismatching users: {len(bad)}")
+
+        await database.close_db()
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*args))
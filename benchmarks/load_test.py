@@ -0,0 +1,333 @@
+"""Offline load test of the tracking pipeline against a local Roblox API stand-in.
+
+Starts an aiohttp server that mimics the presence, users, friends, groups,
+thumbnails and games endpoints RobloxAPI uses (with configurable churn,
+latency and injected 429s), points RobloxAPI at it through ROBLOX_API_BASE,
+and drives the Tracking cog's presence loop body and metadata refresh with a
+stub Discord channel. For each user count it reports presence throughput,
+detection -> delivery latency and per-endpoint request counts.
+
+Run from the repo root:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --users 100,1000 --duration 20 --churn 0.02 --rate-429 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from utils import roblox_api
+from utils.delivery import Delivery
+from utils.rollups import RollupAccumulator
+from utils.user_store import UserStore
+from utils.webhooks import WebhookBatcher
+
+GUILD_ID = 1
+CHANNEL_ID = 1000
+PLACES = 50
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+# --- Roblox stand-in ---
+
+class FakeRoblox:
+    """In-memory Roblox: users flip presence at `churn` (share of users per second)."""
+
+    def __init__(self, users, churn, latency, rate_429, seed=1):
+        self.rng = random.Random(seed)
+        self.user_ids = list(range(1, users + 1))
+        self.state = {uid: (0, None, None) for uid in self.user_ids} # type, place, game
+        self.changed_at = {}
+        self.changes = 0
+        self.churn = churn
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.requests = {}
+        self.injected_429 = 0
+        self.presence_ids = 0
+        self._task = None
+
+    def _new_state(self, old_type):
+        kind = self.rng.choice([t for t in (0, 1, 2) if t != old_type])
+        if kind == 2:
+            place = self.rng.randint(1, PLACES)
+            return (2, place, f"server-{place}-{self.rng.randint(1, 20)}")
+        return (kind, None, None)
+
+    async def _churn(self):
+        carry = 0.0
+        while True:
+            await asyncio.sleep(1)
+            carry += self.churn * len(self.user_ids)
+            flips, carry = int(carry), carry - int(carry)
+            now = time.monotonic()
+            for uid in self.rng.sample(self.user_ids, min(flips, len(self.user_ids))):
+                self.state[uid] = self._new_state(self.state[uid][0])
+                self.changed_at[uid] = now
+                self.changes += 1
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        key = f"{request.method} {ID_SEGMENT.sub('/{id}', request.path)}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+        if self.latency: await asyncio.sleep(self.latency)
+        if self.rate_429 and self.rng.random() < self.rate_429:
+            self.injected_429 += 1
+            return web.json_response({"errors": [{"message": "TooManyRequests"}]}, status=429, headers={"Retry-After": "1"})
+        return await handler(request)
+
+    async def presence(self, request):
+        ids = (await request.json())["userIds"]
+        self.presence_ids += len(ids)
+        out = []
+        for uid in ids:
+            kind, place, game = self.state.get(uid, (0, None, None))
+            out.append({"userId": uid, "userPresenceType": kind, "placeId": place, "gameId": game,
+                        "lastLocation": f"Place {place}" if place else ("Website" if kind == 1 else "")})
+        return web.json_response({"userPresences": out})
+
+    def _user(self, uid):
+        return {"id": uid, "name": f"user{uid}", "displayName": f"User {uid}"}
+
+    async def user(self, request):
+        return web.json_response(self._user(int(request.match_info["uid"])))
+
+    async def users(self, request):
+        ids = (await request.json())["userIds"]
+        return web.json_response({"data": [self._user(int(i)) for i in ids if int(i) in self.state]})
+
+    async def usernames(self, request):
+        names = (await request.json())["usernames"]
+        found = [dict(self._user(int(n[4:])), requestedUsername=n) for n in names
+                 if n.startswith("user") and n[4:].isdigit() and int(n[4:]) in self.state]
+        return web.json_response({"data": found})
+
+    async def socials(self, request):
+        return web.json_response({"data": []})
+
+    async def friends(self, request):
+        uid = int(request.match_info["uid"])
+        return web.json_response({"data": [{"id": f, "name": f"user{f}"} for f in range(uid + 1, uid + 1 + uid % 7)]})
+
+    async def friend_count(self, request):
+        return web.json_response({"count": int(request.match_info["uid"]) % 7})
+
+    async def groups(self, request):
+        uid = int(request.match_info["uid"])
+        return web.json_response({"data": [{"group": {"id": g, "name": f"Group {g}"}, "role": {"rank": 1, "name": "Member"}}
+                                           for g in range(uid % 3)]})
+
+    async def thumbnails(self, request):
+        ids = [int(i) for i in request.query["userIds"].split(",")]
+        return web.json_response({"data": [{"targetId": i, "state": "Completed", "imageUrl": f"https://example.invalid/{i}.png"} for i in ids]})
+
+    async def servers(self, request):
+        return web.json_response({"data": [{"id": request.query.get("serverId"), "playing": 8, "maxPlayers": 12, "ping": 60, "fps": 59}]})
+
+    async def start(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_post("/presence/v1/presence/users", self.presence)
+        app.router.add_get("/users/v1/users/{uid}", self.user)
+        app.router.add_post("/users/v1/users", self.users)
+        app.router.add_post("/users/v1/usernames/users", self.usernames)
+        app.router.add_get("/users/v1/users/{uid}/social-links", self.socials)
+        app.router.add_get("/friends/v1/users/{uid}/friends", self.friends)
+        app.router.add_get("/friends/v1/users/{uid}/friends/count", self.friend_count)
+        app.router.add_get("/groups/v1/users/{uid}/groups/roles", self.groups)
+        app.router.add_get("/thumbnails/v1/users/avatar-headshot", self.thumbnails)
+        app.router.add_get("/games/v1/games/{place}/servers/Public", self.servers)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._task = asyncio.create_task(self._churn())
+        return f"http://127.0.0.1:{self.port}"
+
+    async def stop(self):
+        if self._task: self._task.cancel()
+        await self.runner.cleanup()
+
+# --- Discord stand-in ---
+
+class StubChannel:
+    AUTHOR = re.compile(r"@user(\d+)\)")
+
+    def __init__(self, fake, latency):
+        self.id = CHANNEL_ID
+        self.fake = fake
+        self.latency = latency
+        self.sent = 0
+        self.end_to_end = [] # server-side change -> message sent
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        if self.latency: await asyncio.sleep(self.latency)
+        self.sent += 1
+        m = self.AUTHOR.search(embed.author.name or "") if embed and embed.author else None
+        changed = self.fake.changed_at.get(int(m.group(1))) if m else None
+        if changed: self.end_to_end.append(time.monotonic() - changed)
+
+class StubBot:
+    """The parts of RBXStalkerBot the Tracking cog touches."""
+
+    def __init__(self, api, channel):
+        self.api = api
+        self.tracked = UserStore()
+        self.delivery = Delivery()
+        self.webhooks = WebhookBatcher(api, self.delivery)
+        self.logger = logging.getLogger("RBXStalker")
+        self.channel = channel
+        self.user = None
+
+    def get_channel(self, channel_id):
+        return self.channel if channel_id == CHANNEL_ID else None
+
+    def dispatch(self, event, *args):
+        pass
+
+    async def wait_until_ready(self):
+        await asyncio.Event().wait() # the harness drives the loops itself
+
+# --- Harness ---
+
+def percentile(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def run(users, args):
+    fake = FakeRoblox(users, args.churn, args.latency, args.rate_429)
+    os.environ["ROBLOX_API_BASE"] = await fake.start()
+    os.environ["PRESENCE_BATCHES_PER_SECOND"] = str(args.batches_per_second)
+    os.environ["METADATA_CONCURRENCY"] = str(args.metadata_concurrency)
+    from cogs.tracking import Tracking
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.pool = database.ConnectionPool(os.path.join(tmp, "load.db"))
+        database.writes.rollups = RollupAccumulator()
+        await database.init_db()
+        await database.set_server_config(GUILD_ID, "event_channel_id", CHANNEL_ID)
+        if args.digest:
+            await database.set_server_config(GUILD_ID, "digest_window", args.digest)
+
+        api = roblox_api.RobloxAPI()
+        channel = StubChannel(fake, args.discord_latency)
+        bot = StubBot(api, channel)
+        await bot.tracked.add_many([{"id": uid, "name": f"user{uid}", "displayName": f"User {uid}"} for uid in fake.user_ids])
+        bot.delivery.start()
+        tracking = Tracking(bot)
+        tracking.presence_loop.cancel()
+        tracking.metadata_loop.cancel()
+
+        # 1. Presence: the presence_loop body once a second, like tasks.loop(seconds=1)
+        start = time.monotonic()
+        ticks, slow_ticks = 0, 0
+        while time.monotonic() - start < args.duration:
+            tick = time.monotonic()
+            await tracking.presence_loop.coro(tracking)
+            ticks += 1
+            spent = time.monotonic() - tick
+            if spent > 1: slow_ticks += 1
+            await asyncio.sleep(max(0.0, 1 - spent))
+        presence_elapsed = time.monotonic() - start
+        overdue = tracking.scheduler.backlog()
+        fake._task.cancel() # stop churning, let in-flight changes settle
+
+        drain_start = time.monotonic()
+        while (len(tracking.verifier) or bot.delivery.pending()) and time.monotonic() - drain_start < args.drain:
+            await asyncio.sleep(0.1)
+        tracking.digest.flush_all()
+        await asyncio.sleep(0.5)
+
+        # 2. Metadata refresh (first run: full friend/group downloads for everyone)
+        meta_seconds = None
+        if not args.skip_metadata:
+            meta_start = time.monotonic()
+            await tracking.metadata_loop.coro(tracking)
+            meta_seconds = time.monotonic() - meta_start
+
+        result = {
+            "users": users,
+            "ticks": ticks,
+            "slow_ticks": slow_ticks,
+            "presence_checks_per_s": fake.presence_ids / presence_elapsed,
+            "changes": fake.changes,
+            "verifier": dict(tracking.verifier.stats),
+            "lag": tracking.scheduler.report(),
+            "overdue": overdue,
+            "delivery": dict(bot.delivery.stats),
+            "sent": channel.sent,
+            "detection_avg": bot.delivery.detection_latency.average,
+            "delivery_avg": bot.delivery.delivery_latency.average,
+            "delivery_max": bot.delivery.delivery_latency.worst,
+            "e2e_p50": percentile(channel.end_to_end, 0.5),
+            "e2e_p95": percentile(channel.end_to_end, 0.95),
+            "metadata_seconds": meta_seconds,
+            "requests": dict(sorted(fake.requests.items())),
+            "injected_429": fake.injected_429,
+            "api": api.totals(),
+        }
+
+        tracking.cog_unload()
+        await bot.delivery.stop(timeout=1)
+        await api.close()
+        await database.close_db()
+    await fake.stop()
+    return result
+
+def report(r):
+    print(f"\n=== {r['users']} tracked users ===")
+    print(f"presence: {r['presence_checks_per_s']:.1f} user checks/s over {r['ticks']} ticks ({r['slow_ticks']} over 1s), "
+          f"{r['overdue']} users overdue when polling stopped")
+    for tier, t in r["lag"].items():
+        print(f"  tier {tier}: {t['users']} users every {t['interval']:.0f}s, lag avg {t['avg_lag']:.2f}s max {t['max_lag']:.2f}s")
+    v = r["verifier"]
+    print(f"changes: {r['changes']} on the server • {v['queued']} detected • {v['confirmed']} confirmed • {v['rejected']} rejected")
+    d = r["delivery"]
+    print(f"delivery: {r['sent']} sent • {d['dropped']} dropped • {d['retried']} retried • {d['failed']} failed")
+    print(f"latency: detection->queue avg {r['detection_avg']:.2f}s • queue->sent avg {r['delivery_avg']:.2f}s "
+          f"(max {r['delivery_max']:.2f}s) • server change->sent p50 {r['e2e_p50']:.2f}s p95 {r['e2e_p95']:.2f}s")
+    if r["metadata_seconds"] is not None:
+        print(f"metadata refresh: {r['metadata_seconds']:.1f}s ({r['users'] / r['metadata_seconds']:.0f} users/s)")
+    a = r["api"]
+    print(f"api: {a['requests']} requests • {a['throttled']} throttled • {a['retried']} retried • {a['dropped']} dropped • "
+          f"{r['injected_429']} 429s injected")
+    for endpoint, count in r["requests"].items():
+        print(f"  {count:>7}  {endpoint}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", default="100,1000,10000", help="comma-separated tracked user counts")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of presence polling per run")
+    parser.add_argument("--churn", type=float, default=0.005, help="share of users changing presence per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in API latency (seconds)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="probability a request gets a 429")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="stub channel send latency (seconds)")
+    parser.add_argument("--batches-per-second", type=int, default=1, help="PRESENCE_BATCHES_PER_SECOND")
+    parser.add_argument("--metadata-concurrency", type=int, default=16, help="METADATA_CONCURRENCY")
+    parser.add_argument("--digest", type=int, default=0, help="digest window for the test guild (0 = off)")
+    parser.add_argument("--drain", type=float, default=15, help="max seconds to wait for verification/delivery to finish")
+    parser.add_argument("--skip-metadata", action="store_true")
+    parser.add_argument("--real-limits", action="store_true",
+                        help="keep production per-host rate limits (default lifts them so the bot itself is measured)")
+    args = parser.parse_args()
+
+    logging.getLogger("RBXStalker").setLevel(logging.ERROR)
+    if not args.real_limits:
+        roblox_api.HOST_LIMITS = {}
+        roblox_api.DEFAULT_HOST_LIMIT = (1000, 1000)
+    async def run_all():
+        for users in (int(u) for u in args.users.split(",")):
+            report(await run(users, args))
+    asyncio.run(run_all())
+
+if __name__ == "__main__":
+    main()
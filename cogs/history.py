@@ -0,0 +1,162 @@
+import discord
+from discord.ext import commands
+import time
+from database import (get_presence_events, get_place_visitors, get_activity_rollup, get_place_rollup,
+                      check_rollups, rebuild_rollups, writes)
+from utils.presence_diff import ONLINE, IN_GAME, STUDIO
+from utils import presence_history
+from utils.presence_history import build_segments, format_duration
+from utils.rollups import day_of
+
+MAX_DAYS = 366
+FULL_REBUILD_THRESHOLD = 500 # repair everything at once past this many bad users
+TYPE_LABELS = {ONLINE: "🟢 Online", IN_GAME: "🎮 In Game", STUDIO: "🛠️ Studio"}
+
+class History(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.api = bot.api
+
+    def build_embed(self, title, description, color=0x5865F2):
+        embed = discord.Embed(title=title, description=description, color=color)
+        embed.set_footer(text="RBXStalker V2 • History")
+        return embed
+
+    async def find_user(self, username):
+        """Tracked user by username (case-insensitive), falling back to a Roblox lookup."""
+        name = username.lower()
+        for u in self.bot.tracked.all():
+            if (u['username'] or "").lower() == name: return u
+        user_data = await self.api.get_user_info(username)
+        return self.bot.tracked.get(user_data['id']) if user_data else None
+
+    async def load_segments(self, ctx, username, days):
+        user = await self.find_user(username)
+        if not user:
+            await ctx.send(embed=self.build_embed("Error", "User not being tracked.", 0xFF0000))
+            return None, None
+        days = min(max(1, days), MAX_DAYS)
+        until = time.time()
+        since = until - days * 86400
+        prior, events = await get_presence_events(user['user_id'], since, until)
+        return user, build_segments(prior, events, since, until)
+
+    @commands.hybrid_command(name="sessions", description="Shows a user's recent online sessions.")
+    @commands.has_permissions(administrator=True)
+    async def sessions(self, ctx, username: str, days: int = 7):
+        user, segments = await self.load_segments(ctx, username, days)
+        if user is None: return
+        result = presence_history.sessions(segments)
+        if not result:
+            return await ctx.send(embed=self.build_embed(f"Sessions • {user['display_name']}", f"No activity recorded in the last {days} days."))
+
+        lines = []
+        for start, end, parts in reversed(result[-15:]):
+            games = list(dict.fromkeys(p.game_name for p in parts if p.presence_type == IN_GAME and p.game_name))
+            played = f" • {', '.join(games[:3])}" if games else ""
+            lines.append(f"<t:{int(start)}:f> — **{format_duration(end - start)}**{played}")
+        embed = self.build_embed(f"Sessions • {user['display_name']}", "\n".join(lines))
+        embed.set_footer(text=f"RBXStalker V2 • {len(result)} sessions in {days} days (latest 15 shown)")
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name="playtime", description="Shows time spent online, in game and in Studio.")
+    @commands.has_permissions(administrator=True)
+    async def playtime(self, ctx, username: str, days: int = 7):
+        user, segments = await self.load_segments(ctx, username, days)
+        if user is None: return
+        totals = presence_history.playtime(segments)
+        if not totals:
+            return await ctx.send(embed=self.build_embed(f"Playtime • {user['display_name']}", f"No activity recorded in the last {days} days."))
+
+        lines = [f"{label}: **{format_duration(totals.get(t, 0))}**" for t, label in TYPE_LABELS.items()]
+        lines.append(f"⏱️ Total: **{format_duration(sum(totals.values()))}** over {days} days")
+        await ctx.send(embed=self.build_embed(f"Playtime • {user['display_name']}", "\n".join(lines)))
+
+    @commands.hybrid_command(name="topplaces", description="Shows the games a user spends the most time in.")
+    @commands.has_permissions(administrator=True)
+    async def topplaces(self, ctx, username: str, days: int = 30):
+        user, segments = await self.load_segments(ctx, username, days)
+        if user is None: return
+        places = presence_history.top_places(segments)
+        if not places:
+            return await ctx.send(embed=self.build_embed(f"Top Places • {user['display_name']}", f"No games recorded in the last {days} days."))
+
+        lines = []
+        for i, (place_id, name, seconds, visits) in enumerate(places, 1):
+            label = f"[{name or place_id}](https://www.roblox.com/games/{place_id})" if place_id else (name or "Unknown")
+            lines.append(f"`{i}.` {label} — **{format_duration(seconds)}** ({visits} visits)")
+        await ctx.send(embed=self.build_embed(f"Top Places • {user['display_name']}", "\n".join(lines)))
+
+    @commands.hybrid_command(name="visitors", description="Shows which tracked users played a place.")
+    @commands.has_permissions(administrator=True)
+    async def visitors(self, ctx, place_id: int, days: int = 30):
+        days = min(max(1, days), MAX_DAYS)
+        until = time.time()
+        rows = await get_place_visitors(place_id, until - days * 86400, until)
+        if not rows:
+            return await ctx.send(embed=self.build_embed("Visitors", f"No tracked users joined this place in the last {days} days."))
+
+        name = next((r['game_name'] for r in rows if r['game_name']), None) or place_id
+        lines = []
+        for r in rows[:20]:
+            user = self.bot.tracked.get(r['user_id'])
+            who = f"**{user['display_name']}** (@{user['username']})" if user else f"ID `{r['user_id']}`"
+            lines.append(f"{who} — {r['joins']} joins, last <t:{int(r['last_seen'])}:R>")
+        embed = self.build_embed(f"Visitors • {name}", f"[Open game](https://www.roblox.com/games/{place_id})\n\n" + "\n".join(lines))
+        embed.set_footer(text=f"RBXStalker V2 • {len(rows)} users in {days} days (top 20 shown)")
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(name="stats", description="Shows daily activity totals from the rollups.")
+    @commands.has_permissions(administrator=True)
+    async def stats(self, ctx, username: str, days: int = 30):
+        user = await self.find_user(username)
+        if not user:
+            return await ctx.send(embed=self.build_embed("Error", "User not being tracked.", 0xFF0000))
+        days = min(max(1, days), MAX_DAYS)
+        now = time.time()
+        since_day = day_of(now - (days - 1) * 86400)
+
+        per_day = {}
+        for row in await get_activity_rollup(user['user_id'], since_day):
+            per_day.setdefault(row['day'], {})[row['presence_type']] = row['seconds']
+        # The current state isn't rolled up until it ends
+        current, open_days = writes.rollups.open_segment(user['user_id'], now)
+        for day, seconds in open_days:
+            if day >= since_day:
+                totals = per_day.setdefault(day, {})
+                totals[current[1]] = totals.get(current[1], 0) + seconds
+        if not per_day:
+            return await ctx.send(embed=self.build_embed(f"Stats • {user['display_name']}", f"No activity recorded in the last {days} days."))
+
+        totals = {}
+        for day_totals in per_day.values():
+            for t, seconds in day_totals.items():
+                totals[t] = totals.get(t, 0) + seconds
+        busiest_day, busiest = max(per_day.items(), key=lambda kv: sum(kv[1].values()))
+
+        lines = [f"{label}: **{format_duration(totals.get(t, 0))}**" for t, label in TYPE_LABELS.items()]
+        lines.append(f"📅 Active on **{len(per_day)}/{days}** days • avg **{format_duration(sum(totals.values()) / days)}**/day")
+        lines.append(f"🔥 Busiest day: **{busiest_day}** ({format_duration(sum(busiest.values()))})")
+        places = await get_place_rollup(user['user_id'], since_day)
+        if places:
+            lines.append("\n**Top Places**")
+            for r in places:
+                lines.append(f"• {r['game_name'] or r['place_id']} — **{format_duration(r['seconds'])}** ({r['joins']} joins)")
+        await ctx.send(embed=self.build_embed(f"Stats • {user['display_name']} • {days}d", "\n".join(lines)))
+
+    @commands.hybrid_command(name="statscheck", description="Verifies the activity rollups against raw history.")
+    @commands.has_permissions(administrator=True)
+    async def statscheck(self, ctx, repair: bool = False):
+        msg = await ctx.send(embed=self.build_embed("Stats Check", "⏳ Replaying presence history..."))
+        start = time.monotonic()
+        bad = await check_rollups()
+        text = f"Checked in {time.monotonic() - start:.1f}s: **{len(bad)}** users with mismatching rollups."
+        if bad and repair:
+            count = await rebuild_rollups(None if len(bad) > FULL_REBUILD_THRESHOLD else bad)
+            text += f"\n🔧 Rebuilt from {count} events."
+        elif bad:
+            text += f"\nRun `statscheck True` to rebuild them."
+        await msg.edit(embed=self.build_embed("Stats Check", text, 0xFFA500 if bad else 0x00FF00))
+
+async def setup(bot):
+    await bot.add_cog(History(bot))
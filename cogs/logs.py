@@ -1,16 +1,37 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import os
 import io
-from database import get_server_configs, set_server_config
+from database import guild_configs, set_server_config
 import logging
+import asyncio
+from utils.log_reader import tail, search, parse_time
+from utils.metrics import LOOP_TICK
 
 LOG_FILE = "logs/rbxstalker.log"
+LOG_FLUSH_INTERVAL = 5 # seconds
+LOG_FLUSH_LINES = 20 # flush early once this many lines are waiting...
+LOG_FLUSH_CHARS = 3500 # ...or this much text
+LOG_BUFFER_MAX = 500 # lines held per channel before new ones are dropped
+SEARCH_PAGE_SIZE = 15
 
 class Logs(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.console_logger = logging.getLogger("RBXStalker")
+        self.buffers = {}
+        self.buffer_chars = {}
+        self.dropped = {}
+        self.dropped_total = 0
+        self.flush_loop.start()
+
+    def cog_unload(self):
+        self.flush_loop.cancel()
+        self.flush_all(force=True)
+
+    def flush_pending(self):
+        """Called by the bot on shutdown, while delivery is still running."""
+        self.flush_all(force=True)
         
     def build_embed(self, title, description, color=0x3498db):
         embed = discord.Embed(title=title, description=description, color=color)
@@ -19,37 +40,68 @@ class Logs(commands.Cog):
 
     @commands.Cog.listener()
     async def on_rbx_log(self, guild_id, content, color=None):
-        configs = await get_server_configs()
+        """Buffers the line for each log channel; never waits on Discord."""
+        configs = [guild_configs.get(guild_id)] if guild_id else guild_configs.all()
         
         guild_name = "System"
         if guild_id:
             g = self.bot.get_guild(guild_id)
             if g: guild_name = g.name
 
+        line = f"`{discord.utils.utcnow().strftime('%H:%M:%S')}` **{guild_name}** • {content}"
         for conf in configs:
-            if guild_id and conf['guild_id'] != guild_id: continue
-            if not conf['log_channel_id']: continue
-
-            channel = self.bot.get_channel(conf['log_channel_id'])
-            if channel:
-                try:
-                    # FIX: If log is massive, send as file instead of embed
-                    if len(content) > 3800:
-                        file_data = io.BytesIO(content.encode('utf-8'))
-                        file = discord.File(file_data, filename="log_entry.txt")
-                        
-                        warning_embed = discord.Embed(
-                            description=f"\u26A0 **Log too long for embed.** See attached file.\n**Source:** {guild_name}",
-                            color=color or 0xFFA500
-                        )
-                        await channel.send(embed=warning_embed, file=file)
-                    else:
-                        embed = discord.Embed(description=content, color=color or 0x2b2d31)
-                        embed.set_footer(text=f"Source: {guild_name} • {discord.utils.utcnow().strftime('%H:%M:%S')}")
-                        await channel.send(embed=embed)
-                        
-                except Exception as e:
-                    self.console_logger.error(f"Error sending log to Discord: {e}")
+            if not conf or not conf['log_channel_id']: continue
+            channel_id = conf['log_channel_id']
+
+            buf = self.buffers.setdefault(channel_id, [])
+            if len(buf) >= LOG_BUFFER_MAX:
+                self.dropped[channel_id] = self.dropped.get(channel_id, 0) + 1
+                self.dropped_total += 1
+                continue
+            buf.append(line)
+            self.buffer_chars[channel_id] = self.buffer_chars.get(channel_id, 0) + len(line) + 1
+            if len(buf) >= LOG_FLUSH_LINES or self.buffer_chars[channel_id] >= LOG_FLUSH_CHARS:
+                self.flush(channel_id)
+
+    @tasks.loop(seconds=LOG_FLUSH_INTERVAL)
+    async def flush_loop(self):
+        with LOOP_TICK.time("log_flush"):
+            self.flush_all()
+
+    @flush_loop.before_loop
+    async def before_flush(self):
+        await self.bot.wait_until_ready()
+
+    def flush_all(self, force=False):
+        for channel_id in list(self.buffers):
+            self.flush(channel_id, force)
+
+    def flush(self, channel_id, force=False):
+        # Backpressure: while the previous batch is still queued, keep buffering
+        if not force and self.bot.delivery.backlog(("channel", channel_id)): return
+        lines = self.buffers.pop(channel_id, [])
+        self.buffer_chars.pop(channel_id, None)
+        dropped = self.dropped.pop(channel_id, 0)
+        if not lines and not dropped: return
+
+        channel = self.bot.get_channel(channel_id)
+        if not channel: return
+        text = "\n".join(lines)
+        if dropped:
+            text += f"\n⚠️ **{dropped}** log lines dropped (buffer full)."
+
+        footer = f"{len(lines)} entries • {discord.utils.utcnow().strftime('%H:%M:%S')}"
+        if len(text) > 3800:
+            # Too long for an embed: send the batch as a file
+            data = text.encode('utf-8')
+            embed = discord.Embed(description=f"\u26A0 **{len(lines)} log entries.** See attached file.", color=0xFFA500)
+            embed.set_footer(text=footer)
+            send = lambda: channel.send(embed=embed, file=discord.File(io.BytesIO(data), filename="log_batch.txt"))
+        else:
+            embed = discord.Embed(description=text, color=0x2b2d31)
+            embed.set_footer(text=footer)
+            send = lambda: channel.send(embed=embed)
+        self.bot.delivery.enqueue(("channel", channel_id), send)
 
     @commands.hybrid_group(name="showlogs", fallback="latest")
     @commands.has_permissions(administrator=True)
@@ -59,9 +111,7 @@ class Logs(commands.Cog):
             return await ctx.send(embed=self.build_embed("Error", "No log file found.", 0xFF0000))
         
         try:
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                text = "".join(lines[-20:])
+            text = "\n".join(await asyncio.to_thread(tail, LOG_FILE, 20))
             
             # Use file if even the last 20 lines are huge
             if len(text) > 1900:
@@ -73,6 +123,28 @@ class Logs(commands.Cog):
         except Exception as e:
             await ctx.send(embed=self.build_embed("Error", f"Read error: {e}", 0xFF0000))
 
+    @showlogs.command(name="search", description="Searches the current and rotated logs.")
+    async def search_logs(self, ctx, query: str = None, level: str = None, since: str = None, until: str = None, page: int = 1):
+        """Filters by text, minimum level (INFO/WARNING/ERROR) and time (30m, 2h, 1d or YYYY-MM-DD HH:MM)."""
+        try:
+            since_dt, until_dt = parse_time(since), parse_time(until)
+            results, has_more = await asyncio.to_thread(search, LOG_FILE, query, level, since_dt, until_dt, page, SEARCH_PAGE_SIZE)
+        except (ValueError, OSError) as e:
+            return await ctx.send(embed=self.build_embed("Error", str(e), 0xFF0000))
+
+        if not results:
+            return await ctx.send(embed=self.build_embed("Log Search", "No matching log entries.", 0xFFA500))
+
+        text = "\n".join(results)
+        footer = f"Page {page}" + (f" • more results: page {page + 1}" if has_more else "")
+        if len(text) > 1900:
+            file = discord.File(io.BytesIO(text.encode('utf-8')), filename=f"log_search_p{page}.txt")
+            await ctx.send(content=f"**Log Search ({len(results)} entries, {footer}):**", file=file)
+        else:
+            embed = self.build_embed(f"Log Search • {len(results)} entries", f"```ini\n{text}\n```")
+            embed.set_footer(text=f"RBXStalker V2 Logs • {footer}")
+            await ctx.send(embed=embed)
+
     @showlogs.command(name="save", description="Uploads the full log file.")
     async def save_logs(self, ctx):
         if os.path.exists(LOG_FILE):
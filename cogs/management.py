@@ -2,17 +2,22 @@ import discord
 from discord.ext import commands
 import sys
 import os
-import aiosqlite
-from database import (add_user_to_track, remove_user_track, 
-                      get_all_tracked_users, set_server_config, 
-                      update_user_field, update_history_field, 
-                      set_server_prefix, get_server_prefix, DB_NAME)
-from utils.roblox_api import RobloxAPI
+import io
+import asyncio
+from database import set_server_config, set_server_prefix, get_server_prefix, close_db
+from utils.digest import DIGEST_MAX_WINDOW
+from utils.logger import stop_logger, dropped_records
+from utils import profiler
+
+IMPORT_MAX_BYTES = 1024 * 1024
+PROFILE_LOOPS = ("presence", "metadata", "write_flush", "log_flush")
+PROFILE_MAX_TICKS = 100
 
 class Management(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api = RobloxAPI()
+        self.api = bot.api
+        self.profile_lock = asyncio.Lock()
 
     def build_embed(self, title, description, color=0x3498db):
         embed = discord.Embed(title=title, description=description, color=color)
@@ -23,6 +28,9 @@ class Management(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def restart(self, ctx):
         await ctx.send(embed=self.build_embed("System Restart", "🔄 Restarting...", 0xFFA500))
+        # execv skips atexit and close(): write out buffered DB writes and queued log records first
+        await close_db()
+        stop_logger()
         os.execv(sys.executable, ['python'] + sys.argv)
 
     @commands.hybrid_command(description="Syncs slash commands.")
@@ -62,28 +70,115 @@ class Management(commands.Cog):
         await set_server_config(ctx.guild.id, "event_webhook_url", url)
         await ctx.send(embed=self.build_embed("Configuration", "✅ Webhook configured.", 0x00FF00))
 
-    @commands.hybrid_command(name="priority", description="Toggle High Priority (10s checks) for a user.")
+    @commands.hybrid_command(name="setdigest", description="Merge events into one summary every N seconds (0 = off).")
+    @commands.has_permissions(administrator=True)
+    async def setdigest(self, ctx, seconds: int):
+        if seconds < 0 or seconds > DIGEST_MAX_WINDOW:
+            return await ctx.send(embed=self.build_embed("Error", f"Window must be between 0 and {DIGEST_MAX_WINDOW} seconds.", 0xFF0000))
+        await set_server_config(ctx.guild.id, "digest_window", seconds)
+        status = f"✅ Digest mode **on**: events are summarized every **{seconds}s**." if seconds else "🚫 Digest mode **off**: events are sent individually."
+        await ctx.send(embed=self.build_embed("Configuration", status, 0x00FF00))
+
+    @commands.hybrid_command(name="priority", description="Toggle High Priority, or set a priority tier, for a user.")
     @commands.has_permissions(administrator=True)
-    async def priority(self, ctx, username: str):
+    async def priority(self, ctx, username: str, tier: int = None):
         user_data = await self.api.get_user_info(username)
         if not user_data: return await ctx.send("User not found.")
         
         uid = user_data['id']
-        async with aiosqlite.connect(DB_NAME) as db:
-            cur = await db.execute("SELECT priority FROM tracked_users WHERE user_id = ?", (uid,))
-            row = await cur.fetchone()
-            if not row: return await ctx.send("User not being tracked.")
-            
-            new_prio = 1 if row[0] == 0 else 0
-            await db.execute("UPDATE tracked_users SET priority = ? WHERE user_id = ?", (new_prio, uid))
-            await db.commit()
+        user = self.bot.tracked.get(uid)
+        if not user: return await ctx.send("User not being tracked.")
+        
+        tracking = self.bot.get_cog("Tracking")
+        tiers = tracking.scheduler.tiers if tracking else {0: 35, 1: 10}
+        if tier is None:
+            new_prio = 1 if user['priority'] == 0 else 0
+        elif tier in tiers:
+            new_prio = tier
+        else:
+            valid = ", ".join(f"`{t}` ({int(sec)}s)" for t, sec in sorted(tiers.items()))
+            return await ctx.send(embed=self.build_embed("Error", f"Unknown tier. Configured tiers: {valid}", 0xFF0000))
+        await self.bot.tracked.set_field(uid, "priority", new_prio)
         
-        status = "HIGH (10s)" if new_prio else "NORMAL (30s)"
+        interval = int(tiers.get(new_prio, 0))
+        status = f"HIGH ({interval}s)" if new_prio else f"NORMAL ({interval}s)"
+        if new_prio > 1: status = f"TIER {new_prio} ({interval}s)"
         await ctx.send(embed=self.build_embed("Priority Updated", f"⚡ **{user_data['name']}** is now **{status}** priority.", 0xFFFF00))
 
+    @commands.hybrid_command(name="profile", description="Profiles N ticks of a loop, or a time window, and uploads the result.")
+    @commands.has_permissions(administrator=True)
+    async def profile(self, ctx, target: str = "presence", amount: int = None, mode: str = "sample"):
+        """target: a loop name (amount = ticks) or `window` (amount = seconds). mode: sample or cprofile."""
+        target, mode = target.lower(), mode.lower()
+        if target != "window" and target not in PROFILE_LOOPS:
+            return await ctx.send(embed=self.build_embed("Error", f"Unknown target. Use `window` or one of: {', '.join(PROFILE_LOOPS)}", 0xFF0000))
+        if mode not in ("sample", "cprofile"):
+            return await ctx.send(embed=self.build_embed("Error", "Mode must be `sample` or `cprofile`.", 0xFF0000))
+        if self.profile_lock.locked():
+            return await ctx.send(embed=self.build_embed("Error", "A profile is already running.", 0xFF0000))
+
+        async with self.profile_lock:
+            if target == "window":
+                seconds = min(max(1, amount or 30), profiler.PROFILE_MAX_SECONDS)
+                what = f"a {seconds}s window"
+            else:
+                ticks = min(max(1, amount or 5), PROFILE_MAX_TICKS)
+                what = f"{ticks} `{target}` ticks"
+            msg = await ctx.send(embed=self.build_embed("Profiling", f"⏳ {mode} profiling for {what}...", 0xFFA500))
+            if target == "window":
+                summary, files = await profiler.profile(mode, seconds=seconds)
+            else:
+                summary, files = await profiler.profile(mode, target, ticks=ticks)
+
+        try:
+            await msg.edit(embed=self.build_embed("Profile Ready", f"✅ {mode} profile of {summary}.", 0x00FF00))
+        except discord.HTTPException:
+            pass # e.g. the interaction token expired; the files still go out below
+        # Straight to the channel: a slash command's follow-ups die with its token
+        send = ctx.channel.send if ctx.interaction else ctx.send
+        await send(content=f"📄 **Profile:** {mode}, {summary}", files=[discord.File(io.BytesIO(data), filename=name) for name, data in files])
+
+    @commands.hybrid_command(name="trackstats", description="Shows scheduler lag per priority tier.")
+    @commands.has_permissions(administrator=True)
+    async def trackstats(self, ctx):
+        tracking = self.bot.get_cog("Tracking")
+        if not tracking: return await ctx.send(embed=self.build_embed("Error", "Tracking is not loaded.", 0xFF0000))
+        
+        lines = []
+        for tier, r in tracking.scheduler.report().items():
+            lines.append(f"**Tier {tier}** ({int(r['interval'])}s) • {r['users']} users\n"
+                         f"Lag avg `{r['avg_lag']:.2f}s` • max `{r['max_lag']:.2f}s` • last `{r['last_lag']:.2f}s`")
+        lines.append(f"\n⏳ Overdue: **{tracking.scheduler.backlog()}** • Pending verification: **{len(tracking.verifier)}**")
+        lag = self.bot.lag_monitor.stats
+        lines.append(f"🐢 Event loop: worst lag `{lag['worst']:.2f}s` • {lag['stalls']} stalls logged")
+        meta = tracking.metadata_stats
+        if meta:
+            lines.append(f"🧾 Last metadata refresh: {meta['users']} users in **{meta['seconds']:.1f}s** ({discord.utils.format_dt(meta['finished'], 'R')})")
+        probe = tracking.probe_stats
+        lines.append(f"🔎 Full fetches skipped: friends {probe['friends_skipped']}/{probe['friends_skipped'] + probe['friends_full']} • "
+                     f"groups {probe['groups_skipped']}/{probe['groups_skipped'] + probe['groups_full']}")
+        d = self.bot.delivery
+        lines.append(f"📬 Delivery: {d.stats['sent']} sent • {d.pending()} queued • {d.stats['retried']} retried • {d.stats['failed']} failed • {d.stats['dropped']} dropped\n"
+                     f"Detection latency avg `{d.detection_latency.average:.2f}s` • Delivery latency avg `{d.delivery_latency.average:.2f}s` (max `{d.delivery_latency.worst:.2f}s`)")
+        w = self.bot.webhooks.stats
+        if w['embeds']:
+            lines.append(f"🪝 Webhooks: {w['embeds']} embeds in {w['posts']} posts • {w['rate_limited']} rate limited")
+        logs = self.bot.get_cog("Logs")
+        if logs and logs.dropped_total:
+            lines.append(f"📝 Log forwarding: {logs.dropped_total} lines dropped (buffer full)")
+        if dropped_records():
+            lines.append(f"📝 Logger: {dropped_records()} records dropped (queue full)")
+        api = tracking.api.totals()
+        lines.append(f"🌐 API: {api['requests']} requests • {api['throttled']} throttled • {api['retried']} retried • {api['dropped']} dropped")
+        reuse = " • ".join(f"{host} {tracking.api.reuse_ratio(host):.0%}" for host in sorted(tracking.api.connections))
+        if reuse: lines.append(f"🔌 Connection reuse: {reuse}")
+        cache = tracking.api.server_cache.stats
+        lines.append(f"🗄️ Server info cache: {cache['hits']} hits • {cache['negative_hits']} negative • {cache['shared']} shared • {cache['misses']} misses")
+        await ctx.send(embed=self.build_embed("Tracking Stats", "\n".join(lines)))
+
     @commands.hybrid_group(name="list", fallback="show")
     async def list_group(self, ctx):
-        users = await get_all_tracked_users()
+        users = self.bot.tracked.all()
         if not users: return await ctx.send("No users tracked.")
         msg = ""
         for u in users:
@@ -91,26 +186,43 @@ class Management(commands.Cog):
             msg += f"• {prio} **{u['display_name']}** (@{u['username']}) - {u['ping_mode']}\n"
         await ctx.send(embed=self.build_embed("Tracked Users", msg))
 
+    async def track_identifiers(self, identifiers, mode):
+        """Resolves, fetches avatars for and stores a batch of usernames/IDs. Returns (added, not_found)."""
+        users = await self.api.resolve_users(identifiers)
+        avatars = await self.api.get_avatars([u['id'] for u in users])
+        for u in users:
+            u['avatar_url'] = avatars.get(u['id'])
+        await self.bot.tracked.add_many(users, mode)
+        return len(users), len(set(identifiers)) - len(users)
+
     @list_group.command(name="add", description="Add user(s) to track.")
     @commands.has_permissions(administrator=True)
     async def add_user(self, ctx, identifier: str, mode: str = "ping"):
-        identifiers = [x.strip() for x in identifier.split(',')]
-        count = 0
-        for ident in identifiers:
-            if not ident: continue
-            user_data = await self.api.get_user_info(ident)
-            if user_data:
-                await add_user_to_track(user_data['id'], user_data['name'], user_data['displayName'], mode)
-                await update_user_field(user_data['id'], "last_avatar_url", await self.api.get_avatar(user_data['id']))
-                count += 1
-        await ctx.send(embed=self.build_embed("Success", f"✅ Added {count} users.", 0x00FF00))
+        identifiers = [x.strip() for x in identifier.split(',') if x.strip()]
+        count, missing = await self.track_identifiers(identifiers, mode)
+        note = f"\n⚠️ {missing} not found." if missing > 0 else ""
+        await ctx.send(embed=self.build_embed("Success", f"✅ Added {count} users.{note}", 0x00FF00))
+
+    @list_group.command(name="import", description="Add every username/ID listed in a text file.")
+    @commands.has_permissions(administrator=True)
+    async def import_users(self, ctx, file: discord.Attachment, mode: str = "ping"):
+        if file.size > IMPORT_MAX_BYTES:
+            return await ctx.send(embed=self.build_embed("Error", "File too large (max 1MB).", 0xFF0000))
+        await ctx.defer()
+        text = (await file.read()).decode("utf-8", errors="ignore")
+        identifiers = [x.strip() for x in text.replace(",", "\n").split() if x.strip()]
+        if not identifiers:
+            return await ctx.send(embed=self.build_embed("Error", "No usernames or IDs found in file.", 0xFF0000))
+        count, missing = await self.track_identifiers(identifiers, mode)
+        note = f"\n⚠️ {missing} not found." if missing > 0 else ""
+        await ctx.send(embed=self.build_embed("Import Complete", f"✅ Added {count} users from `{file.filename}`.{note}", 0x00FF00))
 
     @list_group.command(name="remove", description="Remove a user.")
     @commands.has_permissions(administrator=True)
     async def remove_user(self, ctx, identifier: str):
         user_data = await self.api.get_user_info(identifier)
         if user_data:
-            await remove_user_track(user_data['id'])
+            await self.bot.tracked.remove(user_data['id'])
             await ctx.send(embed=self.build_embed("Success", f"🗑️ Removed {user_data['name']}.", 0x00FF00))
         else:
             await ctx.send(embed=self.build_embed("Error", "User not found.", 0xFF0000))
@@ -119,9 +231,10 @@ class Management(commands.Cog):
     async def help(self, ctx):
         p = await get_server_prefix(self.bot, ctx.message)
         embed = discord.Embed(title="RBXStalker V2 Help", color=0x3498db)
-        embed.add_field(name="👥 Tracking", value=f"`{p}list add <user>`\n`{p}list remove <user>`\n`{p}priority <user>`", inline=False)
-        embed.add_field(name="⚙️ Config", value=f"`{p}setchannel events/logs`\n`{p}setwebhook <url>`\n`{p}setprefix <char>`", inline=False)
-        embed.add_field(name="🛠️ System", value=f"`{p}showlogs`\n`{p}clearlogs`\n`{p}restart`", inline=False)
+        embed.add_field(name="👥 Tracking", value=f"`{p}list add <user>`\n`{p}list import <file>`\n`{p}list remove <user>`\n`{p}priority <user> [tier]`\n`{p}trackstats`\n`{p}profile [loop|window] [ticks|seconds] [sample|cprofile]`", inline=False)
+        embed.add_field(name="📈 History", value=f"`{p}sessions <user> [days]`\n`{p}playtime <user> [days]`\n`{p}topplaces <user> [days]`\n`{p}visitors <place_id> [days]`\n`{p}stats <user> [days]`\n`{p}statscheck [repair]`", inline=False)
+        embed.add_field(name="⚙️ Config", value=f"`{p}setchannel events/logs`\n`{p}setwebhook <url>`\n`{p}setprefix <char>`\n`{p}setdigest <seconds>`", inline=False)
+        embed.add_field(name="🛠️ System", value=f"`{p}showlogs`\n`{p}showlogs search [text] [level] [since] [until] [page]`\n`{p}clearlogs`\n`{p}restart`", inline=False)
         await ctx.send(embed=embed)
 
 async def setup(bot):
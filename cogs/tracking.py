@@ -3,10 +3,21 @@ from discord.ext import tasks, commands
 from discord.ui import View, Button
 import json
 import asyncio
-import aiohttp
-from utils.roblox_api import RobloxAPI
+import os
+import time
+from utils.presence_verifier import PresenceVerifier
+from utils.scheduler import PresenceScheduler, parse_tiers, BATCHES_PER_SECOND
+from utils.digest import DigestBuffer, DigestEntry
+from utils.metrics import LOOP_TICK
+from utils.presence_diff import (diff_presences, BECAME_ONLINE, BECAME_OFFLINE,
+                                 JOINED_GAME, GAME_SWAP, IN_STUDIO)
 from database import *
 
+METADATA_CONCURRENCY = 4 # users refreshed at once
+METADATA_SPREAD_FRACTION = 0.9 # share of the interval used when spreading users out
+FRIENDS_MAX_AGE = 6 * 3600 # re-download friend lists at least this often (seconds)
+GROUPS_MAX_AGE = 3600 # groups have no cheap probe, so they only refresh on age
+
 class TrackingView(View):
     def __init__(self, profile_url, game_url=None, server_id=None):
         super().__init__(timeout=None)
@@ -26,208 +37,256 @@ class CopyIDButton(Button):
 class Tracking(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api = RobloxAPI()
-        self.priority_loop.start()
-        self.standard_loop.start()
+        self.api = bot.api
+        self.verifier = PresenceVerifier(self.api, self.on_transition_confirmed)
+        self.digest = DigestBuffer(self.emit_digest)
+        self.scheduler = PresenceScheduler(
+            bot.tracked, parse_tiers(os.getenv("TRACKING_TIERS")),
+            rate=int(os.getenv("PRESENCE_BATCHES_PER_SECOND", BATCHES_PER_SECOND))
+        )
+        self.metadata_concurrency = max(1, int(os.getenv("METADATA_CONCURRENCY", METADATA_CONCURRENCY)))
+        self.metadata_spread = os.getenv("METADATA_SPREAD", "0") == "1"
+        self.metadata_stats = None
+        self.probe_stats = {"probes": 0, "friends_full": 0, "friends_skipped": 0, "groups_full": 0, "groups_skipped": 0}
+        self.presence_loop.start()
         self.metadata_loop.start()
 
     def cog_unload(self):
-        self.priority_loop.cancel()
-        self.standard_loop.cancel()
+        self.presence_loop.cancel()
         self.metadata_loop.cancel()
+        self.verifier.stop()
+        self.digest.flush_all()
+
+    def flush_pending(self):
+        """Called by the bot on shutdown, while delivery is still running."""
+        self.digest.flush_all()
 
-    async def send_webhook(self, url, embed):
-        if not url: return
-        async with aiohttp.ClientSession() as session:
-            try:
-                webhook_data = {
-                    "embeds": [embed.to_dict()],
-                    "username": "RBXStalker Event",
-                    "avatar_url": self.bot.user.avatar.url if self.bot.user.avatar else None
-                }
-                await session.post(url, json=webhook_data)
-            except:
-                pass
-
-    async def dispatch_event(self, title, description, color, username, display, thumb=None, ping=False, ping_mode="ping", 
-                             profile_url=None, game_url=None, server_id=None):
-        configs = await get_server_configs()
+    async def dispatch_event(self, uid, title, description, color, username, display, thumb=None, ping=False, ping_mode="ping", 
+                             profile_url=None, game_url=None, server_id=None, detected_at=None, transition=None):
+        """Builds the event and queues it for every configured destination; returns immediately."""
+        configs = guild_configs.all()
+        if transition: detected_at = detected_at or transition.detected_at
         embed = discord.Embed(description=description, color=color)
         embed.set_author(name=f"{display} (@{username})", icon_url=thumb, url=profile_url)
         if thumb: embed.set_thumbnail(url=thumb)
         embed.set_footer(text="RBXStalker V2 • Real-Time Tracking")
         
         view = TrackingView(profile_url, game_url, server_id)
+        content = "@everyone" if (ping and ping_mode == "ping") else ""
+        digest_entry = None
 
         for conf in configs:
-            # 1. Discord Channel
-            if conf['event_channel_id']:
-                channel = self.bot.get_channel(conf['event_channel_id'])
-                if channel:
-                    content = "@everyone" if (ping and ping_mode == "ping") else ""
-                    try:
-                        await channel.send(content=content, embed=embed, view=view)
-                    except discord.Forbidden: pass
-            
-            # 2. Webhook
-            if conf['event_webhook_url']:
-                await self.send_webhook(conf['event_webhook_url'], embed)
+            # Digest mode: coalesce into one summary per window instead
+            if conf['digest_window']:
+                if digest_entry is None:
+                    digest_entry = DigestEntry(uid, display, username,
+                                               title.replace(display, "", 1).strip(), transition, detected_at)
+                self.digest.add(conf['guild_id'], conf['digest_window'], digest_entry)
+                continue
+
+            self.deliver(conf, embed, detected_at, content=content, view=view)
         
         self.bot.dispatch("rbx_log", None, f"📨 Event Sent: **{title}** ({display})", color)
 
+    def deliver(self, conf, embed, detected_at=None, content="", view=None):
+        # 1. Discord Channel
+        if conf['event_channel_id']:
+            channel = self.bot.get_channel(conf['event_channel_id'])
+            if channel:
+                kwargs = {"content": content, "embed": embed}
+                if view: kwargs["view"] = view
+                self.bot.delivery.enqueue(("channel", channel.id), lambda ch=channel: ch.send(**kwargs), detected_at)
+        
+        # 2. Webhook
+        if conf['event_webhook_url']:
+            self.bot.webhooks.avatar_url = self.bot.user.avatar.url if self.bot.user.avatar else None
+            self.bot.webhooks.add(conf['event_webhook_url'], embed, detected_at)
+
+    def emit_digest(self, guild_id, embed, detected_at):
+        conf = guild_configs.get(guild_id)
+        if conf: self.deliver(conf, embed, detected_at)
+
     # --- MAIN TRACKING LOGIC ---
     async def process_presences(self, users):
         if not users: return
-        user_ids = [u['user_id'] for u in users]
-        resp = await self.api.get_presences(user_ids)
+        local = {u['user_id']: u for u in users}
+        resp = await self.api.get_presences(list(local))
         if not resp or "userPresences" not in resp: return
 
-        for p_data in resp['userPresences']:
-            uid = p_data['userId']
-            new_type = p_data['userPresenceType']
-            local_user = next((u for u in users if u['user_id'] == uid), None)
-            if not local_user: continue
-
-            last_type = local_user['last_presence_type']
-            new_place_id = p_data.get("placeId")
-            new_game_id = p_data.get("gameId")
-            last_place_id = local_user['last_place_id'] 
-            last_game_id = local_user['last_game_id']
-
-            game_swapped = (new_type == 2 and last_type == 2 and (new_place_id != last_place_id or new_game_id != last_game_id))
-
-            if new_type != last_type or game_swapped:
-                # Basic debouncing (sleep and check again)
-                await asyncio.sleep(2)
-                verify = await self.api.get_presences([uid])
-                if not verify or "userPresences" not in verify: continue
-                p_data = verify['userPresences'][0]
-                if p_data['userPresenceType'] != new_type: continue
-
-                username = local_user['username']
-                display = local_user['display_name']
-                thumb = local_user['last_avatar_url']
-                prof_url = f"https://www.roblox.com/users/{uid}/profile"
-                
-                # ONLINE
-                if new_type == 1:
-                    await self.dispatch_event(f"{display} is Online", f"Is now **Online**.", 0x4287f5, username, display, thumb, True, local_user['ping_mode'], profile_url=prof_url)
-                
-                # IN GAME
-                elif new_type == 2:
-                    game_name = p_data.get("lastLocation", "a Game") or "a Game"
-                    desc_lines = []
-                    join_url = None
-                    server_id_display = None
-
-                    if new_place_id and new_game_id:
-                        desc_lines.append(f"Playing: [**{game_name}**](https://www.roblox.com/games/{new_place_id})")
-                        join_url = f"https://www.roblox.com/games/start?placeId={new_place_id}&launchData={new_game_id}"
-                        server_id_display = new_game_id
-                        
-                        s_info = await self.api.get_server_info(new_place_id, new_game_id)
-                        if s_info:
-                            desc_lines.append(f"\n**Server Stats:**")
-                            desc_lines.append(f"👥 **Players:** {s_info['playing']}/{s_info['maxPlayers']}")
-                            desc_lines.append(f"📶 **Ping:** {s_info['ping']}ms")
-                            desc_lines.append(f"🖥️ **FPS:** {s_info['fps']}")
-                            desc_lines.append(f"🆔 **Server ID:** `{s_info['id']}`")
-                        else:
-                            desc_lines.append("\n⚠️ *Could not fetch server stats (Private?)*")
-                            desc_lines.append(f"🆔 **Server ID:** `{new_game_id}`")
-                    else:
-                        desc_lines.append(f"🚫 **{display} does not have joins on.**")
-                        desc_lines.append(f"*(Server ID is hidden by privacy settings)*")
-
-                    await self.dispatch_event(f"{display} started Playing", "\n".join(desc_lines), 0x37B06D, username, display, thumb, True, local_user['ping_mode'], profile_url=prof_url, game_url=join_url, server_id=server_id_display)
-                
-                # STUDIO
-                elif new_type == 3:
-                    await self.dispatch_event(f"{display} is in Studio", f"Is building in **Roblox Studio**.", 0xEE8700, username, display, thumb, True, local_user['ping_mode'], profile_url=prof_url)
+        # Debounce: changes are re-checked in one batch after a short delay,
+        # the loop doesn't wait for that.
+        for t in diff_presences(local, resp['userPresences']):
+            self.verifier.submit(local[t.user_id], t)
+
+    async def on_transition_confirmed(self, local_user, t):
+        if t.user_id not in self.bot.tracked: return
+        # Wall-clock time the change was first seen (detected_at is monotonic)
+        ts = time.time() - (time.monotonic() - t.detected_at) if t.detected_at else time.time()
+        # Record the new state before announcing: the announcement can wait on
+        # server info, and the next poll must not re-detect the same change meanwhile
+        await self.bot.tracked.set_presence(t.user_id, t.presence_type, t.place_id, t.game_id)
+        writes.queue_event(t.user_id, ts, t.presence_type, t.place_id, t.game_id, t.game_name)
+        await self.announce_transition(local_user, t)
+
+    async def announce_transition(self, local_user, t):
+        uid = t.user_id
+        username = local_user['username']
+        display = local_user['display_name']
+        thumb = local_user['last_avatar_url']
+        prof_url = f"https://www.roblox.com/users/{uid}/profile"
+        
+        # ONLINE
+        if t.kind == BECAME_ONLINE:
+            await self.dispatch_event(uid, f"{display} is Online", f"Is now **Online**.", 0x4287f5, username, display, thumb, True, local_user['ping_mode'], profile_url=prof_url, transition=t)
+        
+        # IN GAME
+        elif t.kind in (JOINED_GAME, GAME_SWAP):
+            game_name = t.game_name or "a Game"
+            desc_lines = []
+            join_url = None
+            server_id_display = None
+
+            if t.place_id and t.game_id:
+                desc_lines.append(f"Playing: [**{game_name}**](https://www.roblox.com/games/{t.place_id})")
+                join_url = f"https://www.roblox.com/games/start?placeId={t.place_id}&launchData={t.game_id}"
+                server_id_display = t.game_id
                 
-                # OFFLINE
-                elif new_type == 0:
-                    await self.dispatch_event(f"{display} went Offline", f"Went **Offline**.", 0x808080, username, display, thumb, False, local_user['ping_mode'], profile_url=prof_url)
+                s_info = await self.api.get_server_info(t.place_id, t.game_id)
+                if s_info:
+                    desc_lines.append(f"\n**Server Stats:**")
+                    desc_lines.append(f"👥 **Players:** {s_info['playing']}/{s_info['maxPlayers']}")
+                    desc_lines.append(f"📶 **Ping:** {s_info['ping']}ms")
+                    desc_lines.append(f"🖥️ **FPS:** {s_info['fps']}")
+                    desc_lines.append(f"🆔 **Server ID:** `{s_info['id']}`")
+                else:
+                    desc_lines.append("\n⚠️ *Could not fetch server stats (Private?)*")
+                    desc_lines.append(f"🆔 **Server ID:** `{t.game_id}`")
+            else:
+                desc_lines.append(f"🚫 **{display} does not have joins on.**")
+                desc_lines.append(f"*(Server ID is hidden by privacy settings)*")
 
-                await update_presence_state(uid, new_type, new_place_id, new_game_id)
+            await self.dispatch_event(uid, f"{display} started Playing", "\n".join(desc_lines), 0x37B06D, username, display, thumb, True, local_user['ping_mode'], profile_url=prof_url, transition=t, game_url=join_url, server_id=server_id_display)
+        
+        # STUDIO
+        elif t.kind == IN_STUDIO:
+            await self.dispatch_event(uid, f"{display} is in Studio", f"Is building in **Roblox Studio**.", 0xEE8700, username, display, thumb, True, local_user['ping_mode'], profile_url=prof_url, transition=t)
+        
+        # OFFLINE
+        elif t.kind == BECAME_OFFLINE:
+            await self.dispatch_event(uid, f"{display} went Offline", f"Went **Offline**.", 0x808080, username, display, thumb, False, local_user['ping_mode'], profile_url=prof_url, transition=t)
 
     # --- LOOPS ---
-    @tasks.loop(seconds=10)
-    async def priority_loop(self):
-        """Checks Priority Users (Priority=1)."""
-        all_users = await get_all_tracked_users()
-        prio_users = [u for u in all_users if u['priority'] == 1]
-        await self.process_presences(prio_users)
-
-    @tasks.loop(seconds=35)
-    async def standard_loop(self):
-        """Checks Standard Users (Priority=0)."""
-        all_users = await get_all_tracked_users()
-        norm_users = [u for u in all_users if u['priority'] == 0]
-        chunks = [norm_users[i:i + 50] for i in range(0, len(norm_users), 50)]
-        for chunk in chunks:
-            await self.process_presences(chunk)
-            await asyncio.sleep(1)
+    @tasks.loop(seconds=1)
+    async def presence_loop(self):
+        """Checks whichever users are due (per priority tier), in full batches."""
+        batches = self.scheduler.next_batches()
+        if batches:
+            with LOOP_TICK.time("presence"):
+                await asyncio.gather(*(self.process_presences(b) for b in batches))
 
     @tasks.loop(minutes=10)
     async def metadata_loop(self):
-        """Checks Friends, Groups, and Avatar."""
-        users = await get_all_tracked_users()
+        """Checks Avatars in bulk, then Friends and Groups with a bounded number of users in flight."""
+        users = self.bot.tracked.all()
+        if not users: return
+        start = time.monotonic()
+        await self.refresh_avatars(users)
+
+        sem = asyncio.Semaphore(self.metadata_concurrency)
+        # Optionally spread users over most of the interval instead of bursting
+        spacing = METADATA_SPREAD_FRACTION * self.metadata_loop.minutes * 60 / len(users) if self.metadata_spread else 0
+
+        async def run(i, user):
+            if spacing: await asyncio.sleep(i * spacing)
+            async with sem:
+                try:
+                    await self.refresh_metadata(user)
+                except Exception as e:
+                    self.bot.logger.error(f"Metadata refresh failed for {user['user_id']}: {e}", extra={"user_id": user['user_id'], "loop": "metadata"})
+
+        await asyncio.gather(*(run(i, u) for i, u in enumerate(users)))
+        await writes.flush()
+
+        elapsed = time.monotonic() - start
+        LOOP_TICK.observe(elapsed, "metadata")
+        self.metadata_stats = {"users": len(users), "seconds": elapsed, "finished": discord.utils.utcnow()}
+        self.bot.logger.info(f"Metadata refresh finished: {len(users)} users in {elapsed:.1f}s", extra={"loop": "metadata", "latency": round(elapsed, 3)})
+        if elapsed > self.metadata_loop.minutes * 60:
+            self.bot.logger.warning("Metadata refresh took longer than its interval; raise METADATA_CONCURRENCY.", extra={"loop": "metadata", "latency": round(elapsed, 3)})
+
+    async def refresh_avatars(self, users):
+        avatars = await self.api.get_avatars([u['user_id'] for u in users])
         for user in users:
             uid = user['user_id']
-            history = await get_user_history(uid)
-            if not history: continue
-            
-            prof_url = f"https://www.roblox.com/users/{uid}/profile"
-            username = user['username']
-            display = user['display_name']
-            
-            # 1. Avatar
-            new_avatar = await self.api.get_avatar(uid)
+            new_avatar = avatars.get(uid)
             if new_avatar and new_avatar != user['last_avatar_url']:
                 if user['last_avatar_url']:
-                    await self.dispatch_event(f"Avatar Changed", f"Updated their avatar.", 0xFFFF00, username, display, new_avatar, profile_url=prof_url)
-                await update_user_field(uid, "last_avatar_url", new_avatar)
-
-            # 2. Friends
-            friends_resp = await self.api.get_friends(uid)
-            if friends_resp and 'data' in friends_resp:
-                current = [f['id'] for f in friends_resp['data']]
-                old = json.loads(history['friend_ids'])
-                if not old and current:
-                    await update_history_field(uid, "friend_ids", current)
-                else:
-                    new = set(current) - set(old)
-                    removed = set(old) - set(current)
-                    if new or removed:
-                        desc = ""
-                        for fid in new:
-                            fname = next((f['name'] for f in friends_resp['data'] if f['id'] == fid), str(fid))
-                            desc += f"➕ Added: **{fname}**\n"
-                        for fid in removed:
-                            desc += f"➖ Removed ID: **{fid}**\n"
-                        await self.dispatch_event(f"Friend List Updated", desc, 0x9B59B6, username, display, user['last_avatar_url'], profile_url=prof_url)
-                        await update_history_field(uid, "friend_ids", current)
-            
-            # 3. Groups (New)
-            groups = await self.api.get_user_groups(uid)
-            if groups and 'data' in groups:
-                current_groups = {str(g['group']['id']): g['role']['rank'] for g in groups['data']}
-                old_groups = json.loads(history['group_data']) if history['group_data'] else {}
-                
-                # Check for rank changes or joins
-                if old_groups:
-                    for gid, rank in current_groups.items():
-                        if gid in old_groups and old_groups[gid] != rank:
-                            gname = next((g['group']['name'] for g in groups['data'] if str(g['group']['id']) == gid), "Group")
-                            rname = next((g['role']['name'] for g in groups['data'] if str(g['group']['id']) == gid), "Rank")
-                            await self.dispatch_event(f"Rank Change", f"Rank in **{gname}** changed to **{rname}**.", 0xFFA500, username, display, user['last_avatar_url'], profile_url=prof_url)
-                
-                await update_history_field(uid, "group_data", current_groups)
+                    await self.dispatch_event(uid, f"Avatar Changed", f"Updated their avatar.", 0xFFFF00, user['username'], user['display_name'], new_avatar,
+                                              profile_url=f"https://www.roblox.com/users/{uid}/profile")
+                await self.bot.tracked.set_field(uid, "last_avatar_url", new_avatar)
+
+    async def refresh_metadata(self, user):
+        uid = user['user_id']
+        history = await get_user_history(uid)
+        if not history: return
+        
+        prof_url = f"https://www.roblox.com/users/{uid}/profile"
+        username = user['username']
+        display = user['display_name']
+
+        # Cheap probe first: only download full lists when something moved or they're stale
+        now = time.time()
+        friend_count = await self.api.get_friend_count(uid)
+        self.probe_stats["probes"] += 1
+        need_friends = (friend_count is None or friend_count != history['friend_count']
+                        or now - (history['friends_checked_at'] or 0) > FRIENDS_MAX_AGE)
+        need_groups = now - (history['groups_checked_at'] or 0) > GROUPS_MAX_AGE
+        self.probe_stats["friends_full" if need_friends else "friends_skipped"] += 1
+        self.probe_stats["groups_full" if need_groups else "groups_skipped"] += 1
 
-            await asyncio.sleep(2)
+        friends_resp, groups = await asyncio.gather(
+            self.api.get_friends(uid) if need_friends else asyncio.sleep(0),
+            self.api.get_user_groups(uid) if need_groups else asyncio.sleep(0)
+        )
+
+        # 1. Friends
+        if friends_resp and 'data' in friends_resp:
+            writes.queue_history_value(uid, "friends_checked_at", now)
+            if friend_count is not None:
+                writes.queue_history_value(uid, "friend_count", friend_count)
+            current = [f['id'] for f in friends_resp['data']]
+            old = json.loads(history['friend_ids'])
+            if not old and current:
+                writes.queue_history_field(uid, "friend_ids", current)
+            else:
+                new = set(current) - set(old)
+                removed = set(old) - set(current)
+                if new or removed:
+                    names = {f['id']: f['name'] for f in friends_resp['data']}
+                    desc = ""
+                    for fid in new:
+                        desc += f"➕ Added: **{names.get(fid, fid)}**\n"
+                    for fid in removed:
+                        desc += f"➖ Removed ID: **{fid}**\n"
+                    await self.dispatch_event(uid, f"Friend List Updated", desc, 0x9B59B6, username, display, user['last_avatar_url'], profile_url=prof_url)
+                    writes.queue_history_field(uid, "friend_ids", current)
+        
+        # 2. Groups (New)
+        if groups and 'data' in groups:
+            writes.queue_history_value(uid, "groups_checked_at", now)
+            current_groups = {str(g['group']['id']): g['role']['rank'] for g in groups['data']}
+            old_groups = json.loads(history['group_data']) if history['group_data'] else {}
+            
+            # Check for rank changes or joins
+            if old_groups:
+                for g in groups['data']:
+                    gid = str(g['group']['id'])
+                    if gid in old_groups and old_groups[gid] != current_groups[gid]:
+                        await self.dispatch_event(uid, f"Rank Change", f"Rank in **{g['group']['name']}** changed to **{g['role']['name']}**.", 0xFFA500, username, display, user['last_avatar_url'], profile_url=prof_url)
+            
+            writes.queue_history_field(uid, "group_data", current_groups)
 
-    @priority_loop.before_loop
+    @presence_loop.before_loop
     async def before_tracking(self):
         await self.bot.wait_until_ready()
 
@@ -1,10 +1,279 @@
 import aiosqlite
+import asyncio
 import json
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from utils.metrics import DB_WRITE, DB_FLUSH_ROWS, LOOP_TICK
+from utils.rollups import RollupAccumulator
 
 DB_NAME = "stalker_data.db"
+READER_POOL_SIZE = 3
+
+# Applied to every pooled connection. WAL lets the readers (and the GUI's own
+# sqlite3 connection) run while the writer holds a transaction.
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+]
+
+class ConnectionPool:
+    """Long-lived connections: one serialized writer and a small pool of readers."""
+
+    def __init__(self, path=DB_NAME, readers=READER_POOL_SIZE):
+        self.path = path
+        self.size = readers
+        self.writer = None
+        self.readers = []
+        self._idle = asyncio.Queue()
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self):
+        return self.writer is not None
+
+    async def _connect(self):
+        # cached_statements keeps the prepared statements of the helpers below hot
+        conn = await aiosqlite.connect(self.path, cached_statements=256)
+        conn.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        async with self._open_lock:
+            if self.is_open: return
+            self.writer = await self._connect()
+            for _ in range(self.size):
+                conn = await self._connect()
+                self.readers.append(conn)
+                self._idle.put_nowait(conn)
+
+    async def close(self):
+        async with self._open_lock:
+            if not self.is_open: return
+            async with self._write_lock:
+                await self.writer.commit()
+                await self.writer.close()
+            for conn in self.readers:
+                await conn.close()
+            self.writer = None
+            self.readers = []
+            self._idle = asyncio.Queue()
+
+    @asynccontextmanager
+    async def write(self):
+        """Exclusive access to the writer; commits on success, rolls back on error."""
+        if not self.is_open: await self.open()
+        async with self._write_lock:
+            start = time.perf_counter()
+            try:
+                yield self.writer
+                await self.writer.commit()
+            except BaseException:
+                await self.writer.rollback()
+                raise
+            finally:
+                DB_WRITE.observe(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def read(self):
+        if not self.is_open: await self.open()
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+pool = ConnectionPool()
+
+WRITE_FLUSH_INTERVAL = 0.5 # seconds
+ROLLUP_CHUNK = 50000 # presence_events rows fetched at a time when replaying
+REBUILD_USER_CHUNK = 25 # users replayed and swapped in per write transaction during a rebuild
+ROLLUP_TOLERANCE = 1.0 # seconds of drift the consistency check ignores
+_backfill_task = None
+
+class WriteBuffer:
+    """Write-behind buffer for the hot update paths.
+
+    Presence and field updates are coalesced per user (last write wins) and
+    flushed as one executemany per statement inside a single transaction, so a
+    mass logoff costs one commit instead of one per user.
+    """
+
+    def __init__(self, interval=WRITE_FLUSH_INTERVAL):
+        self.interval = interval
+        self.presence = {}
+        self.user_fields = {}
+        self.history_fields = {}
+        self.events = []
+        self.rollups = RollupAccumulator()
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self):
+        return (len(self.presence) + sum(len(v) for v in self.user_fields.values())
+                + sum(len(v) for v in self.history_fields.values()) + len(self.events))
+
+    def queue_presence(self, user_id, presence_type, place_id, game_id):
+        self.presence[user_id] = (presence_type, place_id, game_id)
+
+    def queue_user_field(self, user_id, field, value):
+        self.user_fields.setdefault(field, {})[user_id] = value
+
+    def queue_history_field(self, user_id, field, value_obj):
+        self.history_fields.setdefault(field, {})[user_id] = json.dumps(value_obj)
+
+    def queue_history_value(self, user_id, field, value):
+        """Like queue_history_field, for plain (non-JSON) columns."""
+        self.history_fields.setdefault(field, {})[user_id] = value
+
+    def queue_event(self, user_id, ts, presence_type, place_id, game_id, game_name):
+        """Appends a confirmed presence change to presence_events (never coalesced)
+        and folds it into the activity rollups, written in the same transaction."""
+        self.events.append((user_id, ts, presence_type, place_id, game_id, game_name))
+        self.rollups.record(user_id, ts, presence_type, place_id, game_name)
+
+    def discard(self, user_id):
+        """Drops pending writes for a user that is being re-added or removed."""
+        self.presence.pop(user_id, None)
+        for pending in (*self.user_fields.values(), *self.history_fields.values()):
+            pending.pop(user_id, None)
+
+    async def flush(self):
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        presence, self.presence = self.presence, {}
+        user_fields, self.user_fields = self.user_fields, {}
+        history_fields, self.history_fields = self.history_fields, {}
+        events, self.events = self.events, []
+        daily, places = self.rollups.drain()
+        if not (presence or user_fields or history_fields or events): return
+
+        try:
+            await self._write(presence, user_fields, history_fields, events, daily, places)
+        except BaseException:
+            self._restore(presence, user_fields, history_fields, events, daily, places)
+            raise
+        DB_FLUSH_ROWS.inc(amount=len(presence) + len(events) + sum(len(v) for v in (*user_fields.values(), *history_fields.values())))
+
+    def _restore(self, presence, user_fields, history_fields, events, daily, places):
+        """Puts a batch whose write failed back in front of whatever was queued since
+        (newer pending values win), so the next flush retries it."""
+        self.presence = {**presence, **self.presence}
+        for fields, pending in ((user_fields, self.user_fields), (history_fields, self.history_fields)):
+            for field, values in fields.items():
+                pending[field] = {**values, **pending.get(field, {})}
+        self.events = events + self.events
+        self.rollups.restore(daily, places)
+
+    async def _write(self, presence, user_fields, history_fields, events, daily, places):
+        async with pool.write() as db:
+            if presence:
+                await db.executemany("""
+                    UPDATE tracked_users 
+                    SET last_presence_type = ?, last_place_id = ?, last_game_id = ?
+                    WHERE user_id = ?
+                """, [(*state, uid) for uid, state in presence.items()])
+            for field, values in user_fields.items():
+                await db.executemany(f"UPDATE tracked_users SET {field} = ? WHERE user_id = ?",
+                                     [(v, uid) for uid, v in values.items()])
+            for field, values in history_fields.items():
+                await db.executemany(f"UPDATE user_history SET {field} = ? WHERE user_id = ?",
+                                     [(v, uid) for uid, v in values.items()])
+            if events:
+                await db.executemany("""
+                    INSERT INTO presence_events (user_id, ts, presence_type, place_id, game_id, game_name)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, events)
+            await apply_rollups(db, daily, places)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                with LOOP_TICK.time("write_flush"):
+                    await self.flush()
+            except Exception:
+                logging.getLogger("RBXStalker").exception("Write-behind flush failed")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+writes = WriteBuffer()
+
+SERVER_CONFIG_DEFAULTS = {
+    "event_channel_id": None,
+    "log_channel_id": None,
+    "event_webhook_url": None,
+    "admin_role_id": None,
+    "prefix": "!",
+    "show_logs_on_startup": 1,
+    "digest_window": 0,
+}
+
+class GuildConfigCache:
+    """In-memory copy of server_config, loaded at startup and updated by the setters.
+
+    The prefix callable and event fan-out read from here on every message/event,
+    so they never touch the disk.
+    """
+
+    def __init__(self):
+        self.configs = {}
+        self.loaded = False
+
+    async def load(self):
+        async with pool.read() as db:
+            cursor = await db.execute("SELECT * FROM server_config")
+            rows = await cursor.fetchall()
+        self.configs = {row['guild_id']: dict(row) for row in rows}
+        self.loaded = True
+
+    async def ensure_loaded(self):
+        if not self.loaded: await self.load()
+
+    def get(self, guild_id):
+        return self.configs.get(guild_id)
+
+    def all(self):
+        return list(self.configs.values())
+
+    def prefix(self, guild_id):
+        conf = self.configs.get(guild_id)
+        return conf['prefix'] if conf and conf['prefix'] else "!"
+
+    def update(self, guild_id, key, value):
+        conf = self.configs.get(guild_id)
+        if conf is None:
+            conf = self.configs[guild_id] = {"guild_id": guild_id, **SERVER_CONFIG_DEFAULTS}
+        conf[key] = value
+
+    def invalidate(self):
+        """Forces the next ensure_loaded() to re-read the table."""
+        self.configs = {}
+        self.loaded = False
+
+guild_configs = GuildConfigCache()
 
 async def init_db():
-    async with aiosqlite.connect(DB_NAME) as db:
+    await pool.open()
+    writes.start()
+    async with pool.write() as db:
         # 1. Tracked Users Table
         await db.execute("""
             CREATE TABLE IF NOT EXISTS tracked_users (
@@ -43,11 +312,49 @@ async def init_db():
                 event_webhook_url TEXT,
                 admin_role_id INTEGER,
                 prefix TEXT DEFAULT '!',
-                show_logs_on_startup INTEGER DEFAULT 1
+                show_logs_on_startup INTEGER DEFAULT 1,
+                digest_window INTEGER DEFAULT 0
             )
         """)
         
-        # 4. Migrations (Safe updates for existing DBs)
+        # 4. Presence History (append-only, one row per confirmed change)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS presence_events (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                ts REAL NOT NULL,
+                presence_type INTEGER NOT NULL,
+                place_id INTEGER,
+                game_id TEXT,
+                game_name TEXT
+            )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_presence_events_user_ts ON presence_events (user_id, ts)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_presence_events_place_ts ON presence_events (place_id, ts)")
+
+        # 5. Activity Rollups (maintained from presence_events, see utils/rollups.py)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS activity_daily (
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                presence_type INTEGER NOT NULL,
+                seconds REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day, presence_type)
+            ) WITHOUT ROWID
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS place_daily (
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                place_id INTEGER NOT NULL,
+                joins INTEGER NOT NULL DEFAULT 0,
+                seconds REAL NOT NULL DEFAULT 0,
+                game_name TEXT,
+                PRIMARY KEY (user_id, day, place_id)
+            ) WITHOUT ROWID
+        """)
+
+        # 6. Migrations (Safe updates for existing DBs)
         migrations = [
             "ALTER TABLE tracked_users ADD COLUMN priority INTEGER DEFAULT 0",
             "ALTER TABLE tracked_users ADD COLUMN last_place_id INTEGER",
@@ -56,7 +363,11 @@ async def init_db():
             "ALTER TABLE user_history ADD COLUMN socials TEXT DEFAULT '{}'",
             "ALTER TABLE server_config ADD COLUMN event_webhook_url TEXT",
             "ALTER TABLE server_config ADD COLUMN show_logs_on_startup INTEGER DEFAULT 1",
-            "ALTER TABLE server_config ADD COLUMN prefix TEXT DEFAULT '!'"
+            "ALTER TABLE server_config ADD COLUMN prefix TEXT DEFAULT '!'",
+            "ALTER TABLE user_history ADD COLUMN friend_count INTEGER",
+            "ALTER TABLE user_history ADD COLUMN friends_checked_at REAL",
+            "ALTER TABLE user_history ADD COLUMN groups_checked_at REAL",
+            "ALTER TABLE server_config ADD COLUMN digest_window INTEGER DEFAULT 0"
         ]
         
         for mig in migrations:
@@ -65,7 +376,19 @@ async def init_db():
             except Exception:
                 pass 
 
-        await db.commit()
+    await guild_configs.load()
+    await load_rollup_state()
+    missing = await rollups_missing()
+    if missing:
+        # Rebuilt in the background; an interrupted backfill resumes with the users it hadn't reached
+        global _backfill_task
+        _backfill_task = asyncio.create_task(backfill_rollups(missing))
+
+async def close_db():
+    if _backfill_task and not _backfill_task.done():
+        _backfill_task.cancel() # users it hadn't reached are picked up on the next start
+    await writes.stop()
+    await pool.close()
 
 async def get_db():
     return await aiosqlite.connect(DB_NAME)
@@ -73,86 +396,260 @@ async def get_db():
 # --- HELPERS ---
 
 async def get_prefix_by_guild_id(guild_id):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT prefix FROM server_config WHERE guild_id = ?", (guild_id,))
-        row = await cursor.fetchone()
-        return row[0] if row else "!"
+    await guild_configs.ensure_loaded()
+    return guild_configs.prefix(guild_id)
 
 async def get_server_prefix(bot, message):
     if not message.guild:
         return "!"
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT prefix FROM server_config WHERE guild_id = ?", (message.guild.id,))
-        row = await cursor.fetchone()
-        return row[0] if row else "!"
+    await guild_configs.ensure_loaded()
+    return guild_configs.prefix(message.guild.id)
 
 async def set_server_prefix(guild_id, new_prefix):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-            INSERT INTO server_config (guild_id, prefix) VALUES (?, ?)
-            ON CONFLICT(guild_id) DO UPDATE SET prefix = ?
-        """, (guild_id, new_prefix, new_prefix))
-        await db.commit()
+    await set_server_config(guild_id, "prefix", new_prefix)
 
 async def add_user_to_track(user_id, username, display_name, ping_mode='ping', priority=0):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with pool.write() as db:
         await db.execute("""
             INSERT OR REPLACE INTO tracked_users 
             (user_id, username, display_name, ping_mode, priority, enabled) 
             VALUES (?, ?, ?, ?, ?, 1)
         """, (user_id, username, display_name, ping_mode, priority))
         await db.execute("INSERT OR IGNORE INTO user_history (user_id) VALUES (?)", (user_id,))
-        await db.commit()
+
+async def add_users_to_track(users, ping_mode='ping', priority=0):
+    """Bulk version of add_user_to_track: one transaction for the whole list of
+    {id, name, displayName, avatar_url} dicts."""
+    async with pool.write() as db:
+        await db.executemany("""
+            INSERT OR REPLACE INTO tracked_users 
+            (user_id, username, display_name, ping_mode, priority, enabled, last_avatar_url) 
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+        """, [(u['id'], u['name'], u['displayName'], ping_mode, priority, u.get('avatar_url')) for u in users])
+        await db.executemany("INSERT OR IGNORE INTO user_history (user_id) VALUES (?)", [(u['id'],) for u in users])
 
 async def remove_user_track(user_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with pool.write() as db:
         await db.execute("DELETE FROM tracked_users WHERE user_id = ?", (user_id,))
         await db.execute("DELETE FROM user_history WHERE user_id = ?", (user_id,))
-        await db.commit()
 
 async def get_all_tracked_users():
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.read() as db:
         cursor = await db.execute("SELECT * FROM tracked_users WHERE enabled = 1")
         return await cursor.fetchall()
 
 async def update_user_field(user_id, field, value):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with pool.write() as db:
         await db.execute(f"UPDATE tracked_users SET {field} = ? WHERE user_id = ?", (value, user_id))
-        await db.commit()
 
 async def update_presence_state(user_id, presence_type, place_id, game_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with pool.write() as db:
         await db.execute("""
             UPDATE tracked_users 
             SET last_presence_type = ?, last_place_id = ?, last_game_id = ?
             WHERE user_id = ?
         """, (presence_type, place_id, game_id, user_id))
-        await db.commit()
 
 async def get_user_history(user_id):
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
+    async with pool.read() as db:
         cursor = await db.execute("SELECT * FROM user_history WHERE user_id = ?", (user_id,))
         row = await cursor.fetchone()
         return row if row else None
 
 async def update_history_field(user_id, field, value_obj):
     json_val = json.dumps(value_obj)
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with pool.write() as db:
         await db.execute(f"UPDATE user_history SET {field} = ? WHERE user_id = ?", (json_val, user_id))
-        await db.commit()
+
+async def get_presence_events(user_id, since, until):
+    """A user's presence events in [since, until), oldest first, plus the last
+    event before `since` (or None) so the state at the window start is known."""
+    async with pool.read() as db:
+        cursor = await db.execute("""
+            SELECT ts, presence_type, place_id, game_name FROM presence_events
+            WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT 1
+        """, (user_id, since))
+        prior = await cursor.fetchone()
+        cursor = await db.execute("""
+            SELECT ts, presence_type, place_id, game_name FROM presence_events
+            WHERE user_id = ? AND ts >= ? AND ts < ? ORDER BY ts
+        """, (user_id, since, until))
+        return prior, await cursor.fetchall()
+
+async def get_place_visitors(place_id, since, until):
+    """Users who joined a place in [since, until), with their join counts and last join."""
+    async with pool.read() as db:
+        cursor = await db.execute("""
+            SELECT user_id, COUNT(*) AS joins, MAX(ts) AS last_seen, MAX(game_name) AS game_name FROM presence_events
+            WHERE place_id = ? AND ts >= ? AND ts < ?
+            GROUP BY user_id ORDER BY joins DESC
+        """, (place_id, since, until))
+        return await cursor.fetchall()
+
+# --- ACTIVITY ROLLUPS ---
+
+async def apply_rollups(db, daily, places):
+    """Adds RollupAccumulator deltas onto the rollup tables."""
+    if daily:
+        await db.executemany("""
+            INSERT INTO activity_daily (user_id, day, presence_type, seconds) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id, day, presence_type) DO UPDATE SET seconds = seconds + excluded.seconds
+        """, [(*key, seconds) for key, seconds in daily.items()])
+    if places:
+        await db.executemany("""
+            INSERT INTO place_daily (user_id, day, place_id, joins, seconds, game_name) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, day, place_id) DO UPDATE SET joins = joins + excluded.joins,
+                seconds = seconds + excluded.seconds, game_name = COALESCE(excluded.game_name, game_name)
+        """, [(*key, joins, seconds, name) for key, (joins, seconds, name) in places.items()])
+
+async def load_rollup_state():
+    """Seeds the live accumulator with each user's latest event (their open state)."""
+    async with pool.read() as db:
+        cursor = await db.execute("""
+            SELECT user_id, ts, presence_type, place_id, game_name FROM presence_events
+            WHERE id IN (SELECT MAX(id) FROM presence_events GROUP BY user_id)
+        """)
+        for row in await cursor.fetchall():
+            writes.rollups.last[row['user_id']] = (row['ts'], row['presence_type'], row['place_id'], row['game_name'])
+
+async def _stream_events(db, user_ids=None):
+    """Yields presence_events ordered by (user_id, ts), a chunk at a time."""
+    where = f"WHERE user_id IN ({','.join('?' * len(user_ids))})" if user_ids else ""
+    cursor = await db.execute(f"""
+        SELECT user_id, ts, presence_type, place_id, game_name FROM presence_events
+        {where} ORDER BY user_id, ts
+    """, tuple(user_ids or ()))
+    while True:
+        rows = await cursor.fetchmany(ROLLUP_CHUNK)
+        if not rows: break
+        for row in rows:
+            yield row
+
+async def rebuild_rollups(user_ids=None):
+    """Recomputes the rollups from raw presence_events (all users, or `user_ids`).
+
+    Pending writes are flushed first and further flushes wait until the
+    rebuild is done, so live updates can't be double-counted or lost. Events
+    are replayed outside the writer and each chunk of users is swapped in its
+    own short transaction, so other writers only ever wait for one chunk.
+    Returns the number of events replayed.
+    """
+    count = 0
+    async with writes._flush_lock:
+        await writes._flush()
+        if user_ids:
+            user_ids = sorted(set(user_ids))
+        else:
+            async with pool.write() as db:
+                # Rollup rows of users that have no events at all
+                await db.execute("DELETE FROM activity_daily WHERE user_id NOT IN (SELECT DISTINCT user_id FROM presence_events)")
+                await db.execute("DELETE FROM place_daily WHERE user_id NOT IN (SELECT DISTINCT user_id FROM presence_events)")
+            async with pool.read() as db:
+                cursor = await db.execute("SELECT DISTINCT user_id FROM presence_events ORDER BY user_id")
+                user_ids = [r['user_id'] for r in await cursor.fetchall()]
+
+        for i in range(0, len(user_ids), REBUILD_USER_CHUNK):
+            chunk = user_ids[i:i + REBUILD_USER_CHUNK]
+            acc = RollupAccumulator()
+            async with pool.read() as reader:
+                async for row in _stream_events(reader, chunk):
+                    acc.record(row['user_id'], row['ts'], row['presence_type'], row['place_id'], row['game_name'])
+                    count += 1
+            marks = ",".join("?" * len(chunk))
+            async with pool.write() as db:
+                await db.execute(f"DELETE FROM activity_daily WHERE user_id IN ({marks})", tuple(chunk))
+                await db.execute(f"DELETE FROM place_daily WHERE user_id IN ({marks})", tuple(chunk))
+                await apply_rollups(db, *acc.drain())
+    return count
+
+async def rollups_missing():
+    """Users with presence history but no rollups built from it yet: history from
+    before the rollups existed, or the rest of an interrupted backfill. (Users
+    who were never online in between have nothing to roll up and show here too;
+    replaying them is cheap.)"""
+    async with pool.read() as db:
+        cursor = await db.execute("""
+            SELECT DISTINCT user_id FROM presence_events
+            WHERE user_id NOT IN (SELECT DISTINCT user_id FROM activity_daily)
+              AND user_id NOT IN (SELECT DISTINCT user_id FROM place_daily)
+        """)
+        return [r['user_id'] for r in await cursor.fetchall()]
+
+async def backfill_rollups(user_ids):
+    try:
+        count = await rebuild_rollups(user_ids)
+        logging.getLogger("RBXStalker").info(f"Backfilled activity rollups for {len(user_ids)} users from {count} presence events")
+    except Exception:
+        logging.getLogger("RBXStalker").exception("Activity rollup backfill failed")
+
+async def check_rollups():
+    """Replays presence_events against the stored rollups. Returns mismatching user_ids."""
+    mismatched = []
+    async with pool.read() as db:
+        # One read transaction, so events and rollups come from the same snapshot
+        await db.execute("BEGIN")
+        try:
+            acc, current = RollupAccumulator(), None
+
+            async def compare(user_id):
+                daily, places = acc.drain()
+                cursor = await db.execute("SELECT day, presence_type, seconds FROM activity_daily WHERE user_id = ?", (user_id,))
+                stored = {(user_id, r['day'], r['presence_type']): r['seconds'] for r in await cursor.fetchall()}
+                cursor = await db.execute("SELECT day, place_id, joins, seconds FROM place_daily WHERE user_id = ?", (user_id,))
+                stored_places = {(user_id, r['day'], r['place_id']): (r['joins'], r['seconds']) for r in await cursor.fetchall()}
+                ok = (stored.keys() == daily.keys() and stored_places.keys() == places.keys()
+                      and all(abs(stored[k] - v) <= ROLLUP_TOLERANCE for k, v in daily.items())
+                      and all(stored_places[k][0] == j and abs(stored_places[k][1] - sec) <= ROLLUP_TOLERANCE
+                              for k, (j, sec, _) in places.items()))
+                if not ok: mismatched.append(user_id)
+
+            async for row in _stream_events(db):
+                if current is not None and row['user_id'] != current:
+                    await compare(current)
+                current = row['user_id']
+                acc.record(row['user_id'], row['ts'], row['presence_type'], row['place_id'], row['game_name'])
+            if current is not None:
+                await compare(current)
+
+            # Rollup rows for users that have no events at all
+            cursor = await db.execute("""
+                SELECT DISTINCT user_id FROM activity_daily
+                WHERE user_id NOT IN (SELECT DISTINCT user_id FROM presence_events)
+            """)
+            mismatched += [r['user_id'] for r in await cursor.fetchall()]
+        finally:
+            await db.execute("ROLLBACK")
+    return mismatched
+
+async def get_activity_rollup(user_id, since_day):
+    """Per-day seconds by presence type from `since_day` ('YYYY-MM-DD') onwards."""
+    async with pool.read() as db:
+        cursor = await db.execute("""
+            SELECT day, presence_type, seconds FROM activity_daily
+            WHERE user_id = ? AND day >= ? ORDER BY day
+        """, (user_id, since_day))
+        return await cursor.fetchall()
+
+async def get_place_rollup(user_id, since_day, limit=5):
+    async with pool.read() as db:
+        cursor = await db.execute("""
+            SELECT place_id, MAX(game_name) AS game_name, SUM(joins) AS joins, SUM(seconds) AS seconds
+            FROM place_daily WHERE user_id = ? AND day >= ?
+            GROUP BY place_id ORDER BY seconds DESC LIMIT ?
+        """, (user_id, since_day, limit))
+        return await cursor.fetchall()
 
 async def set_server_config(guild_id, key, value):
-    async with aiosqlite.connect(DB_NAME) as db:
+    if key not in SERVER_CONFIG_DEFAULTS:
+        raise ValueError(f"Unknown server_config key: {key}")
+    async with pool.write() as db:
         await db.execute(f"""
             INSERT INTO server_config (guild_id, {key}) VALUES (?, ?)
             ON CONFLICT(guild_id) DO UPDATE SET {key} = ?
         """, (guild_id, value, value))
-        await db.commit()
+    await guild_configs.ensure_loaded()
+    guild_configs.update(guild_id, key, value)
         
 async def get_server_configs():
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM server_config")
-        return await cursor.fetchall()
\ No newline at end of file
+    await guild_configs.ensure_loaded()
+    return guild_configs.all()
\ No newline at end of file
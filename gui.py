@@ -4,12 +4,13 @@ import sys
 import os
 import sqlite3
 import asyncio
-import aiohttp
+from concurrent.futures import TimeoutError as FutureTimeout
 from tkinter import messagebox
 from dotenv import load_dotenv
 
 # Import the bot starter
-from main import start_bot_thread
+from main import start_bot_thread, run_on_bot, BotNotRunning
+from utils.roblox_api import RobloxAPI
 
 # Configuration
 ctk.set_appearance_mode("Dark")
@@ -126,7 +127,7 @@ class App(ctk.CTk):
         self.input_label = ctk.CTkLabel(self.sidebar, text="ADD TRACKING TARGET", font=ctk.CTkFont(size=11, weight="bold"), text_color="gray")
         self.input_label.grid(row=2, column=0, padx=20, pady=(10,5), sticky="w")
 
-        self.entry_input = ctk.CTkEntry(self.sidebar, placeholder_text="Username or ID")
+        self.entry_input = ctk.CTkEntry(self.sidebar, placeholder_text="Username(s) or ID(s)")
         self.entry_input.grid(row=3, column=0, padx=20, pady=(0, 10))
         
         self.add_btn = ctk.CTkButton(self.sidebar, text="+ Add User", command=self.start_add_process, fg_color="#3498db", hover_color="#2980b9", font=("Segoe UI", 13, "bold"))
@@ -187,44 +188,61 @@ class App(ctk.CTk):
         threading.Thread(target=self.fetch_and_add_user, args=(user_input,), daemon=True).start()
 
     def fetch_and_add_user(self, user_input):
-        asyncio.run(self._async_fetch(user_input))
+        identifiers = user_input.split(",")
+        try:
+            try:
+                # Reuse the bot's pooled client when it's running
+                users = run_on_bot(lambda b: self._async_fetch(b.api, identifiers), timeout=120)
+            except BotNotRunning:
+                users = asyncio.run(self._standalone_fetch(identifiers))
+        except FutureTimeout:
+            return self.after(0, lambda: self.fail_add("Lookup timed out"))
+        except Exception as e:
+            return self.after(0, lambda: self.fail_add(f"Lookup failed: {e}"))
+        self.after(0, lambda: self.finalize_add(users))
+
+    def fail_add(self, message):
+        self.add_btn.configure(state="normal", text="+ Add User")
+        self.status_label.configure(text=message, text_color="red")
 
-    async def _async_fetch(self, user_input):
-        url = "https://users.roblox.com/v1/usernames/users"
-        final_id = None
-        final_name = None
-        
-        async with aiohttp.ClientSession() as session:
-            if user_input.isdigit():
-                async with session.get(f"https://users.roblox.com/v1/users/{user_input}") as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        final_id = data['id']
-                        final_name = data['name']
-            
-            if not final_id:
-                payload = {"usernames": [user_input], "excludeBannedUsers": True}
-                async with session.post(url, json=payload) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        if data['data']:
-                            final_id = data['data'][0]['id']
-                            final_name = data['data'][0]['name']
-
-        self.after(0, lambda: self.finalize_add(final_id, final_name))
-
-    def finalize_add(self, uid, name):
+    async def _standalone_fetch(self, identifiers):
+        api = RobloxAPI()
+        try:
+            return await self._async_fetch(api, identifiers)
+        finally:
+            await api.close()
+
+    async def _async_fetch(self, api, identifiers):
+        # Accepts a comma-separated list, resolved with one batched lookup
+        users = await api.resolve_users(identifiers)
+        avatars = await api.get_avatars([u['id'] for u in users])
+        for u in users:
+            u['avatar_url'] = avatars.get(u['id'])
+        return users
+
+    def finalize_add(self, users):
         self.add_btn.configure(state="normal", text="+ Add User")
         
-        if uid and name:
+        if users:
             try:
-                conn = self.get_db()
-                conn.execute("INSERT OR REPLACE INTO tracked_users (user_id, username, display_name, enabled, ping_mode) VALUES (?, ?, ?, 1, 'ping')", (uid, name, name))
-                conn.execute("INSERT OR IGNORE INTO user_history (user_id) VALUES (?)", (uid,))
-                conn.commit()
-                conn.close()
+                # Go through the bot's user store when it's running so the loops see the change
+                try:
+                    run_on_bot(lambda b: b.tracked.add_many(users))
+                except FutureTimeout:
+                    # Still running on the bot's loop; it lands in the list once it commits
+                    self.status_label.configure(text="Still saving...", text_color="yellow")
+                    self.after(5000, lambda: self.load_users(force_rebuild=True))
+                    return
+                except BotNotRunning:
+                    conn = self.get_db()
+                    conn.executemany("INSERT OR REPLACE INTO tracked_users (user_id, username, display_name, last_avatar_url, enabled, ping_mode) VALUES (?, ?, ?, ?, 1, 'ping')",
+                                     [(u['id'], u['name'], u['displayName'], u['avatar_url']) for u in users])
+                    conn.executemany("INSERT OR IGNORE INTO user_history (user_id) VALUES (?)", [(u['id'],) for u in users])
+                    conn.commit()
+                    conn.close()
                 self.entry_input.delete(0, 'end')
-                self.status_label.configure(text=f"Added: {name}", text_color="#2ecc71")
+                label = users[0]['name'] if len(users) == 1 else f"{len(users)} users"
+                self.status_label.configure(text=f"Added: {label}", text_color="#2ecc71")
                 self.load_users(force_rebuild=True)
             except Exception as e:
                 self.status_label.configure(text="DB Error", text_color="red")
@@ -233,30 +251,37 @@ class App(ctk.CTk):
             messagebox.showerror("Error", "Could not find user on Roblox.")
 
     # --- ACTIONS ---
+    def set_user_field(self, uid, field, value):
+        try:
+            return run_on_bot(lambda b: b.tracked.set_field(uid, field, value))
+        except BotNotRunning:
+            pass
+        conn = self.get_db()
+        conn.execute(f"UPDATE tracked_users SET {field} = ? WHERE user_id = ?", (value, uid))
+        conn.commit()
+        conn.close()
+
     def remove_user(self, uid):
         if messagebox.askyesno("Confirm", f"Stop tracking ID {uid}?"):
-            conn = self.get_db()
-            conn.execute("DELETE FROM tracked_users WHERE user_id = ?", (uid,))
-            conn.commit()
-            conn.close()
+            try:
+                run_on_bot(lambda b: b.tracked.remove(uid))
+            except BotNotRunning:
+                conn = self.get_db()
+                conn.execute("DELETE FROM tracked_users WHERE user_id = ?", (uid,))
+                conn.commit()
+                conn.close()
             if uid in self.user_rows:
                 for w in self.user_rows[uid].values(): w.destroy()
                 del self.user_rows[uid]
 
     def toggle_priority(self, uid, current_val):
         new_val = 1 if current_val == 0 else 0
-        conn = self.get_db()
-        conn.execute("UPDATE tracked_users SET priority = ? WHERE user_id = ?", (new_val, uid))
-        conn.commit()
-        conn.close()
+        self.set_user_field(uid, "priority", new_val)
         self.load_users()
 
     def toggle_ping(self, uid, current_mode):
         new_mode = "noping" if current_mode == "ping" else "ping"
-        conn = self.get_db()
-        conn.execute("UPDATE tracked_users SET ping_mode = ? WHERE user_id = ?", (new_mode, uid))
-        conn.commit()
-        conn.close()
+        self.set_user_field(uid, "ping_mode", new_mode)
         self.load_users()
 
     # --- REFRESH LOGIC ---
@@ -294,9 +319,9 @@ class App(ctk.CTk):
             status_text = status_map.get(u['last_presence_type'], "Unknown")
             status_color = "#e74c3c" if u['last_presence_type'] == 0 else "#2ecc71" if u['last_presence_type'] == 1 else "#3498db" if u['last_presence_type'] == 2 else "#f39c12"
 
-            p_text = "⚡ HIGH" if u['priority'] == 1 else "Normal"
-            p_fg = "#f1c40f" if u['priority'] == 1 else "transparent"
-            p_text_col = "black" if u['priority'] == 1 else "gray"
+            p_text = "⚡ HIGH" if u['priority'] == 1 else f"⚡ T{u['priority']}" if u['priority'] else "Normal"
+            p_fg = "#f1c40f" if u['priority'] else "transparent"
+            p_text_col = "black" if u['priority'] else "gray"
             
             ping_text = "🔔 Ping" if u['ping_mode'] == "ping" else "🔕 Silent"
             ping_fg = "#9b59b6" if u['ping_mode'] == "ping" else "transparent"
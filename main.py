@@ -11,8 +11,14 @@ load_dotenv()
 # We check for token inside the function now, to allow GUI to create .env first
 import discord
 from discord.ext import commands
-from database import init_db, get_server_prefix, get_server_configs
+from database import init_db, close_db, get_server_prefix, get_server_configs, writes
 from utils.logger import setup_logger
+from utils.user_store import UserStore
+from utils.roblox_api import RobloxAPI
+from utils.delivery import Delivery
+from utils.webhooks import WebhookBatcher
+from utils.metrics import MetricsServer, registry, METRICS_PORT
+from utils.profiler import LoopLagMonitor, LAG_THRESHOLD
 
 intents = discord.Intents.default()
 intents.message_content = True
@@ -21,22 +27,73 @@ class RBXStalkerBot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix=get_server_prefix, intents=intents, help_command=None)
         self.logger = setup_logger()
+        self.tracked = UserStore()
+        # One pooled HTTP client for every cog (and the GUI while the bot runs)
+        self.api = RobloxAPI()
+        self.delivery = Delivery()
+        self.webhooks = WebhookBatcher(self.api, self.delivery)
+        # Localhost Prometheus endpoint; METRICS_PORT=0 turns it off
+        port = int(os.getenv("METRICS_PORT", METRICS_PORT))
+        self.metrics = MetricsServer(port=port) if port else None
+        self.lag_monitor = LoopLagMonitor(float(os.getenv("LOOP_LAG_THRESHOLD", LAG_THRESHOLD)))
+        registry.gauge("rbx_tracked_users", "Enabled tracked users.", lambda: len(self.tracked))
+        registry.gauge("rbx_delivery_pending", "Messages queued or in flight to Discord.", self.delivery.pending)
+        registry.gauge("rbx_db_pending_writes", "Rows waiting in the write-behind buffer.", lambda: len(writes))
+        registry.gauge("rbx_presence_overdue_users", "Users past their check deadline.",
+                       lambda: self.get_cog("Tracking").scheduler.backlog())
+        registry.gauge("rbx_verifier_pending", "Transitions waiting for confirmation.",
+                       lambda: len(self.get_cog("Tracking").verifier))
 
     async def setup_hook(self):
         await init_db()
-        extensions = ['cogs.management', 'cogs.tracking', 'cogs.logs']
+        await self.tracked.load()
+        self.delivery.start()
+        self.lag_monitor.start()
+        if self.metrics: await self.metrics.start()
+        extensions = ['cogs.management', 'cogs.tracking', 'cogs.logs', 'cogs.history']
         for ext in extensions:
             try:
                 await self.load_extension(ext)
             except Exception as e:
                 self.logger.error(f"Failed {ext}: {e}")
 
+    async def close(self):
+        # Cogs are only unloaded inside super().close(), after delivery has
+        # stopped, so buffered output is handed over here first
+        for cog in list(self.cogs.values()):
+            flush = getattr(cog, "flush_pending", None)
+            if flush: flush()
+        self.webhooks.flush_all()
+        await self.delivery.stop()
+        self.lag_monitor.stop()
+        if self.metrics: await self.metrics.stop()
+        await super().close()
+        await self.api.close()
+        await close_db()
+
     async def on_ready(self):
         self.logger.info(f"Logged in as {self.user}")
         print(f"Bot Connected: {self.user}")
 
 # --- THREADING ENTRY POINT ---
+BOT = None
+
+class BotNotRunning(Exception):
+    pass
+
+def run_on_bot(fn, timeout=10):
+    """Runs the coroutine returned by fn(bot) on the bot's loop (used by the GUI thread)
+    and returns its result. Raises BotNotRunning if the bot isn't up so the caller can fall back.
+
+    Gated on the user store, not on_ready: once the store is loaded in setup_hook
+    every change has to go through it, or the tracking loops never see it."""
+    bot = BOT
+    if bot is None or not bot.tracked.loaded or bot.is_closed():
+        raise BotNotRunning()
+    return asyncio.run_coroutine_threadsafe(fn(bot), bot.loop).result(timeout=timeout)
+
 def run_bot():
+    global BOT
     # Reload environment to ensure we get the token if it was just saved
     load_dotenv()
     TOKEN = os.getenv("DISCORD_TOKEN")
@@ -49,7 +106,7 @@ def run_bot():
         if sys.platform == 'win32':
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         
-        bot = RBXStalkerBot()
+        bot = BOT = RBXStalkerBot()
         asyncio.run(bot.start(TOKEN))
     except Exception as e:
         traceback.print_exc()
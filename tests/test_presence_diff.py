@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.presence_diff import (classify, diff_presences, Transition, OFFLINE, ONLINE, IN_GAME, STUDIO,
+                                 BECAME_ONLINE, BECAME_OFFLINE, JOINED_GAME, GAME_SWAP, IN_STUDIO)
+
+def user(presence_type, place_id=None, game_id=None):
+    return {"last_presence_type": presence_type, "last_place_id": place_id, "last_game_id": game_id}
+
+def presence(user_id, presence_type, place_id=None, game_id=None, location=""):
+    return {"userId": user_id, "userPresenceType": presence_type, "placeId": place_id,
+            "gameId": game_id, "lastLocation": location}
+
+class ClassifyTests(unittest.TestCase):
+    def test_type_changes(self):
+        self.assertEqual(classify(OFFLINE, None, None, ONLINE, None, None), BECAME_ONLINE)
+        self.assertEqual(classify(ONLINE, None, None, OFFLINE, None, None), BECAME_OFFLINE)
+        self.assertEqual(classify(ONLINE, None, None, IN_GAME, 1, "a"), JOINED_GAME)
+        self.assertEqual(classify(OFFLINE, None, None, STUDIO, None, None), IN_STUDIO)
+        self.assertEqual(classify(IN_GAME, 1, "a", OFFLINE, None, None), BECAME_OFFLINE)
+
+    def test_game_swap(self):
+        self.assertEqual(classify(IN_GAME, 1, "a", IN_GAME, 2, "b"), GAME_SWAP)
+        self.assertEqual(classify(IN_GAME, 1, "a", IN_GAME, 2, "a"), GAME_SWAP) # other place
+        self.assertEqual(classify(IN_GAME, 1, "a", IN_GAME, 1, "b"), GAME_SWAP) # other server
+
+    def test_no_change(self):
+        for state in ((OFFLINE, None, None), (ONLINE, None, None), (STUDIO, None, None), (IN_GAME, 1, "a")):
+            self.assertIsNone(classify(*state, *state))
+        # Place/server only matter while in game
+        self.assertIsNone(classify(ONLINE, 1, "a", ONLINE, None, None))
+
+    def test_unknown_type(self):
+        self.assertIsNone(classify(OFFLINE, None, None, 99, None, None))
+
+class DiffPresencesTests(unittest.TestCase):
+    def test_transitions(self):
+        users = {1: user(OFFLINE), 2: user(ONLINE), 3: user(IN_GAME, 10, "a"), 4: user(ONLINE), 5: user(STUDIO)}
+        presences = [
+            presence(1, ONLINE, location="Website"),
+            presence(2, IN_GAME, 10, "a", "Some Game"),
+            presence(3, IN_GAME, 11, "b", "Other Game"),
+            presence(4, STUDIO),
+            presence(5, OFFLINE),
+        ]
+        self.assertEqual(diff_presences(users, presences), [
+            Transition(BECAME_ONLINE, 1, ONLINE, OFFLINE, game_name="Website"),
+            Transition(JOINED_GAME, 2, IN_GAME, ONLINE, 10, "a", "Some Game"),
+            Transition(GAME_SWAP, 3, IN_GAME, IN_GAME, 11, "b", "Other Game"),
+            Transition(IN_STUDIO, 4, STUDIO, ONLINE, game_name=""),
+            Transition(BECAME_OFFLINE, 5, OFFLINE, STUDIO, game_name=""),
+        ])
+
+    def test_game_swap_by_place_and_by_server(self):
+        users = {1: user(IN_GAME, 10, "a"), 2: user(IN_GAME, 10, "a")}
+        transitions = diff_presences(users, [presence(1, IN_GAME, 11, "a"), presence(2, IN_GAME, 10, "b")])
+        self.assertEqual([(t.user_id, t.kind, t.place_id, t.game_id) for t in transitions],
+                         [(1, GAME_SWAP, 11, "a"), (2, GAME_SWAP, 10, "b")])
+
+    def test_no_change(self):
+        users = {1: user(OFFLINE), 2: user(IN_GAME, 10, "a")}
+        self.assertEqual(diff_presences(users, [presence(1, OFFLINE), presence(2, IN_GAME, 10, "a")]), [])
+
+    def test_untracked_users_ignored(self):
+        users = {1: user(OFFLINE)}
+        transitions = diff_presences(users, [presence(2, ONLINE), presence(1, ONLINE), presence(3, IN_GAME, 1, "a")])
+        self.assertEqual([t.user_id for t in transitions], [1])
+
+    def test_detected_at_is_set(self):
+        [t] = diff_presences({1: user(OFFLINE)}, [presence(1, ONLINE)])
+        self.assertIsNotNone(t.detected_at)
+
+    def test_missing_place_fields(self):
+        # Older responses may omit placeId/gameId entirely
+        [t] = diff_presences({1: user(OFFLINE)}, [{"userId": 1, "userPresenceType": IN_GAME}])
+        self.assertEqual((t.kind, t.place_id, t.game_id, t.game_name), (JOINED_GAME, None, None, None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.presence_diff import Transition, diff_presences, BECAME_ONLINE, BECAME_OFFLINE, OFFLINE, ONLINE
+from utils.presence_verifier import PresenceVerifier
+
+DELAY = 0.05
+
+class FakeAPI:
+    """Presence API returning `state`; calls block while `gate` is cleared."""
+
+    def __init__(self, state):
+        self.state = state
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.calls = 0
+
+    async def get_presences(self, ids):
+        self.calls += 1
+        await self.gate.wait()
+        return {"userPresences": [{"userId": uid, "userPresenceType": self.state[uid]} for uid in ids]}
+
+def online(uid=1):
+    return Transition(BECAME_ONLINE, uid, ONLINE, OFFLINE)
+
+class PresenceVerifierTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.api = FakeAPI({1: ONLINE})
+        self.confirmed = []
+
+        async def on_confirmed(user, t):
+            self.confirmed.append(t)
+        self.verifier = PresenceVerifier(self.api, on_confirmed, delay=DELAY)
+
+    async def asyncTearDown(self):
+        self.verifier.stop()
+
+    async def test_repeated_submit_keeps_queue_time(self):
+        # Re-detected several times inside the window: confirmed once, on time
+        for _ in range(3):
+            self.verifier.submit({}, online())
+            await asyncio.sleep(DELAY / 4)
+        self.assertEqual(self.verifier.stats["repeats"], 2)
+        await asyncio.sleep(DELAY)
+        self.assertEqual(len(self.confirmed), 1)
+
+    async def test_repeat_during_verification_is_ignored(self):
+        self.api.gate.clear()
+        self.verifier.submit({}, online())
+        while not self.api.calls:
+            await asyncio.sleep(0.01)
+        # A poll lands while the check is in flight and still sees the old state
+        self.verifier.submit({}, online())
+        self.assertEqual(len(self.verifier), 0)
+        self.api.gate.set()
+        await asyncio.sleep(DELAY * 3)
+        self.assertEqual(len(self.confirmed), 1)
+        self.assertEqual(self.api.calls, 1)
+        self.assertEqual(self.verifier.verifying, {})
+
+    async def test_new_transition_during_verification_is_queued(self):
+        self.api.gate.clear()
+        self.verifier.submit({}, online())
+        while not self.api.calls:
+            await asyncio.sleep(0.01)
+        self.verifier.submit({}, Transition(BECAME_OFFLINE, 1, OFFLINE, ONLINE))
+        self.assertEqual(len(self.verifier), 1)
+        self.api.gate.set()
+        await asyncio.sleep(DELAY * 3)
+        # The offline change is rejected (the API still reports online)
+        self.assertEqual([t.kind for t in self.confirmed], [BECAME_ONLINE])
+        self.assertEqual(self.verifier.stats["rejected"], 1)
+
+    async def test_polling_faster_than_delay(self):
+        # The user's last known state only updates once the change is confirmed
+        users = {1: {"last_presence_type": OFFLINE, "last_place_id": None, "last_game_id": None}}
+
+        async def on_confirmed(user, t):
+            users[1]["last_presence_type"] = t.presence_type
+            self.confirmed.append(t)
+        self.verifier.on_confirmed = on_confirmed
+
+        for _ in range(10):
+            for t in diff_presences(users, [{"userId": 1, "userPresenceType": ONLINE}]):
+                self.verifier.submit(users[1], t)
+            await asyncio.sleep(DELAY / 3)
+        # Confirmed while the polls were still coming in, not only once they stopped
+        self.assertEqual(len(self.confirmed), 1)
+
+if __name__ == "__main__":
+    unittest.main()
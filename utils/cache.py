@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Async LRU cache with a TTL per entry and single-flight loading.
+
+    Concurrent callers asking for the same missing key share one in-flight
+    load. `None` results are cached too, for `negative_ttl` seconds, so known
+    dead keys (private servers etc.) aren't retried on every event. Loaders
+    signal transient failures by raising; those are never cached.
+    """
+
+    def __init__(self, maxsize=512, ttl=30, negative_ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "shared": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None: return False, None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def get(self, key, loader):
+        """Returns the cached value for key, calling `await loader()` at most once per miss."""
+        found, value = self._lookup(key)
+        if found:
+            self.stats["hits" if value is not None else "negative_hits"] += 1
+            return value
+
+        task = self.inflight.get(key)
+        if task:
+            self.stats["shared"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = self.inflight[key] = asyncio.ensure_future(self._load(key, loader))
+        # shield: one caller being cancelled must not cancel the shared load
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader):
+        try:
+            value = await loader()
+            self._store(key, value)
+            return value
+        finally:
+            self.inflight.pop(key, None)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import discord
+
+from utils.metrics import DISCORD_SEND, DISCORD_FAILURES, DELIVERY_LAG
+from utils.rate_limit import TokenBucket, backoff_delay
+from utils.scheduler import LagStats
+
+logger = logging.getLogger("RBXStalker")
+
+DELIVERY_WORKERS = 4
+DESTINATION_QUEUE_SIZE = 200 # per channel/webhook; oldest messages are dropped past this
+DELIVERY_MAX_ATTEMPTS = 4
+# (messages per second, burst) per destination kind
+DESTINATION_LIMITS = {
+    "channel": (1, 5),
+    "webhook": (0.5, 5),
+}
+DEFAULT_DESTINATION_LIMIT = (1, 5)
+
+class PermanentDeliveryError(Exception):
+    """Raised by senders for failures a retry can't fix (e.g. a deleted webhook)."""
+
+class DeliveryJob:
+    __slots__ = ("send", "detected_at", "enqueued_at", "attempts")
+
+    def __init__(self, send, detected_at=None):
+        self.send = send
+        self.enqueued_at = time.monotonic()
+        self.detected_at = detected_at or self.enqueued_at
+        self.attempts = 0
+
+class Destination:
+    __slots__ = ("key", "queue", "bucket", "active")
+
+    def __init__(self, key):
+        self.key = key
+        self.queue = deque()
+        self.bucket = TokenBucket(*DESTINATION_LIMITS.get(key[0], DEFAULT_DESTINATION_LIMIT))
+        self.active = False
+
+class Delivery:
+    """Queued, concurrent fan-out of outgoing Discord messages.
+
+    Every destination (channel or webhook) gets its own bounded queue and rate
+    limit; a small pool of workers serves whichever destinations have work,
+    one message in flight per destination so ordering is kept. A slow or
+    rate-limited channel only delays itself. `enqueue()` never waits.
+    """
+
+    def __init__(self, workers=DELIVERY_WORKERS, queue_size=DESTINATION_QUEUE_SIZE):
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.destinations = {}
+        self.ready = asyncio.Queue()
+        self.workers = []
+        self.stats = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+        # detection: change seen by the API -> handed to delivery; delivery: handed over -> sent
+        self.detection_latency = LagStats()
+        self.delivery_latency = LagStats()
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self, timeout=5):
+        """Gives queued messages a moment to go out, then stops the workers."""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self.workers:
+            task.cancel()
+        self.workers = []
+
+    def pending(self):
+        return sum(len(d.queue) + d.active for d in self.destinations.values())
+
+    def backlog(self, key):
+        """Messages queued or in flight for one destination."""
+        dest = self.destinations.get(key)
+        return len(dest.queue) + dest.active if dest else 0
+
+    def enqueue(self, key, send, detected_at=None):
+        """Queues `await send()` for destination `key` (e.g. ("channel", id))."""
+        dest = self.destinations.get(key)
+        if dest is None:
+            dest = self.destinations[key] = Destination(key)
+        if len(dest.queue) >= self.queue_size:
+            dest.queue.popleft()
+            self.stats["dropped"] += 1
+        job = DeliveryJob(send, detected_at)
+        self.detection_latency.record(job.enqueued_at - job.detected_at)
+        dest.queue.append(job)
+        self.stats["enqueued"] += 1
+        if not dest.active:
+            dest.active = True
+            self.ready.put_nowait(dest)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            dest = await self.ready.get()
+            wait = dest.bucket.wait_time()
+            if wait > 0:
+                # Rate-limited: park the destination instead of tying up a worker
+                loop.call_later(wait, self.ready.put_nowait, dest)
+                continue
+            try:
+                await self._send_next(dest)
+            except Exception as e:
+                logger.error(f"Delivery worker error for {dest.key}: {e}")
+            if dest.queue:
+                self.ready.put_nowait(dest)
+            else:
+                dest.active = False
+
+    async def _send_next(self, dest):
+        job = dest.queue.popleft()
+        await dest.bucket.acquire()
+        job.attempts += 1
+        kind = dest.key[0]
+        start = time.perf_counter()
+        try:
+            await job.send()
+        except (discord.Forbidden, discord.NotFound, PermanentDeliveryError) as e:
+            # Permanent: missing permissions or deleted channel/webhook
+            DISCORD_FAILURES.inc(kind, "permanent")
+            self.stats["failed"] += 1
+            logger.warning(f"Delivery to {dest.key} failed permanently: {e}")
+            return
+        except Exception as e:
+            DISCORD_FAILURES.inc(kind, "rate_limited" if getattr(e, "retry_after", None) else "error")
+            if job.attempts >= DELIVERY_MAX_ATTEMPTS:
+                self.stats["failed"] += 1
+                logger.warning(f"Delivery to {dest.key} failed after {job.attempts} attempts: {e}")
+            else:
+                # Back to the front of its own queue; only this destination waits
+                self.stats["retried"] += 1
+                dest.queue.appendleft(job)
+                dest.bucket.block_for(backoff_delay(job.attempts, floor=getattr(e, "retry_after", 0) or 0))
+            return
+
+        finally:
+            DISCORD_SEND.observe(time.perf_counter() - start, kind)
+
+        self.stats["sent"] += 1
+        self.delivery_latency.record(time.monotonic() - job.enqueued_at)
+        DELIVERY_LAG.observe(time.monotonic() - job.detected_at, kind)
@@ -0,0 +1,85 @@
+import asyncio
+
+import discord
+
+from utils.presence_diff import IN_GAME
+
+DIGEST_MAX_WINDOW = 3600 # seconds
+DIGEST_DESCRIPTION_LIMIT = 3900 # stay under Discord's 4096 embed description cap
+
+class DigestEntry:
+    __slots__ = ("user_id", "display", "username", "summary", "transition", "detected_at")
+
+    def __init__(self, user_id, display, username, summary, transition=None, detected_at=None):
+        self.user_id = user_id
+        self.display = display
+        self.username = username
+        self.summary = summary
+        self.transition = transition
+        self.detected_at = detected_at
+
+class DigestBuffer:
+    """Per-guild event coalescing for high-churn trackers.
+
+    Events for a guild in digest mode are held for its window and then sent as
+    one summary embed with a single line per user. Presence flaps that cancel
+    out inside the window (online then offline, ...) are dropped entirely, and
+    a user's presence changes collapse to their latest state. That caps a
+    guild at one message per window no matter how many users are tracked.
+    """
+
+    def __init__(self, emit):
+        self.emit = emit # emit(guild_id, embed, detected_at)
+        self.pending = {}
+        self.timers = {}
+        self.stats = {"events": 0, "contradictions_dropped": 0, "digests": 0}
+
+    def add(self, guild_id, window, entry):
+        self.pending.setdefault(guild_id, []).append(entry)
+        self.stats["events"] += 1
+        if guild_id not in self.timers:
+            window = min(max(1, window), DIGEST_MAX_WINDOW)
+            self.timers[guild_id] = asyncio.get_running_loop().call_later(window, self.flush, guild_id)
+
+    def flush_all(self):
+        for guild_id in list(self.pending):
+            self.flush(guild_id)
+
+    def flush(self, guild_id):
+        timer = self.timers.pop(guild_id, None)
+        if timer: timer.cancel()
+        entries = self.pending.pop(guild_id, [])
+
+        by_user = {}
+        for e in entries:
+            by_user.setdefault(e.user_id, []).append(e)
+
+        lines = []
+        for events in by_user.values():
+            parts = []
+            presence = [e for e in events if e.transition]
+            if presence:
+                first, last = presence[0].transition, presence[-1].transition
+                # Net no-op (e.g. online -> offline back to where they started): drop the pair
+                if first.previous_type == last.presence_type and last.presence_type != IN_GAME:
+                    self.stats["contradictions_dropped"] += len(presence)
+                else:
+                    parts.append(presence[-1].summary)
+            parts += [e.summary for e in events if not e.transition]
+            if parts:
+                e = events[-1]
+                lines.append(f"**{e.display}** (@{e.username}): " + " • ".join(parts))
+        if not lines: return
+
+        description = ""
+        for i, line in enumerate(lines):
+            if len(description) + len(line) > DIGEST_DESCRIPTION_LIMIT:
+                description += f"*…and {len(lines) - i} more*"
+                break
+            description += line + "\n"
+
+        embed = discord.Embed(title=f"Activity Digest • {len(lines)} users", description=description, color=0x5865F2)
+        embed.set_footer(text="RBXStalker V2 • Digest Mode")
+        detected = min((e.detected_at for e in entries if e.detected_at), default=None)
+        self.stats["digests"] += 1
+        self.emit(guild_id, embed, detected)
@@ -0,0 +1,98 @@
+import datetime
+import os
+import re
+
+READ_BLOCK = 8192
+BACKUP_COUNT = 5 # matches the RotatingFileHandler in utils/logger.py
+MAX_RECORD_LINES = 50 # continuation lines (tracebacks) kept per record
+RECORD_HEADER = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:,\d+)? \[(\w+)\] ")
+RELATIVE_TIME = re.compile(r"^(\d+)([smhd])$")
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+def reverse_lines(path, block=READ_BLOCK):
+    """Yields a file's lines last to first, reading fixed-size blocks from the end."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step) + rest
+            parts = chunk.split(b"\n")
+            rest = parts.pop(0) # may be the tail of a line that starts in an earlier block
+            for line in reversed(parts):
+                yield line.decode("utf-8", errors="replace")
+        if rest:
+            yield rest.decode("utf-8", errors="replace")
+
+def tail(path, n=20):
+    """Last `n` lines of a file; cost depends on `n`, not on the file size."""
+    lines = []
+    for line in reverse_lines(path):
+        if not lines and not line: continue # trailing newline
+        lines.append(line)
+        if len(lines) >= n: break
+    return lines[::-1]
+
+def log_files(path, backups=BACKUP_COUNT):
+    """The current log and its rotated backups, newest first."""
+    candidates = [path] + [f"{path}.{i}" for i in range(1, backups + 1)]
+    return [p for p in candidates if os.path.exists(p)]
+
+def parse_time(value, now=None):
+    """Accepts `30m` / `2h` / `1d` (ago) or `YYYY-MM-DD[ HH:MM[:SS]]`."""
+    if not value: return None
+    now = now or datetime.datetime.now()
+    m = RELATIVE_TIME.match(value.strip().lower())
+    if m:
+        return now - datetime.timedelta(seconds=int(m.group(1)) * UNIT_SECONDS[m.group(2)])
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time `{value}` (use 30m, 2h, 1d or YYYY-MM-DD HH:MM)")
+
+def reverse_records(path):
+    """Yields (timestamp, level, text) per log record, newest first; tracebacks stay attached."""
+    continuation = []
+    for line in reverse_lines(path):
+        m = RECORD_HEADER.match(line)
+        if not m:
+            if line and len(continuation) < MAX_RECORD_LINES:
+                continuation.append(line)
+            continue
+        ts = datetime.datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
+        yield ts, m.group(2), "\n".join([line] + continuation[::-1])
+        continuation = []
+
+def search(path, query=None, level=None, since=None, until=None, page=1, per_page=15):
+    """Streams the current and rotated logs newest first and returns one page of matches.
+
+    `level` is a minimum severity. Memory is bounded by the page size: matches
+    before the requested page are only counted. Returns (records, has_more).
+    """
+    if level and level.upper() not in LEVELS:
+        raise ValueError(f"Unknown level `{level}` (use {', '.join(LEVELS)})")
+    min_level = LEVELS[level.upper()] if level else None
+    needle = query.lower() if query else None
+    skip = (max(1, page) - 1) * per_page
+    results = []
+
+    for file in log_files(path):
+        for ts, lvl, text in reverse_records(file):
+            if until and ts > until: continue
+            if since and ts < since:
+                return results, False # everything after this is older still
+            if min_level is not None and LEVELS.get(lvl, 0) < min_level: continue
+            if needle and needle not in text.lower(): continue
+            if skip:
+                skip -= 1
+                continue
+            if len(results) >= per_page:
+                return results, True
+            results.append(text)
+    return results, False
@@ -1,18 +1,65 @@
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
 import sys
 
 LOG_DIR = "logs"
 LOG_FILE_NAME = "rbxstalker.log"
+JSON_LOG_FILE_NAME = "rbxstalker.jsonl"
+LOG_QUEUE_SIZE = 10000 # records waiting for the writer thread; extras are dropped past this
+# Per-record context passed as logger.info(..., extra={...}); copied into JSON output
+CONTEXT_FIELDS = ("user_id", "guild_id", "loop", "latency")
+
+_listener = None
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: a full queue drops the record."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any CONTEXT_FIELDS set on the record."""
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
 
 def setup_logger():
+    """Configures the RBXStalker logger.
+
+    Callers only put records on a queue; a background listener thread does the
+    console/file writes and rotations, so slow disks never stall the event loop.
+    Set LOG_JSON=1 to also write structured JSON lines to logs/rbxstalker.jsonl.
+    """
+    global _listener
     if not os.path.exists(LOG_DIR):
         os.makedirs(LOG_DIR)
 
     logger = logging.getLogger("RBXStalker")
     logger.setLevel(logging.INFO)
 
+    stop_logger()
     if logger.hasHandlers():
         logger.handlers.clear()
 
@@ -21,7 +68,6 @@ def setup_logger():
     console_handler.setFormatter(logging.Formatter(
         "%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
     ))
-    logger.addHandler(console_handler)
 
     # 2. File Output with Rotation (Max 5MB per file, keeps 5 backups)
     file_handler = logging.handlers.RotatingFileHandler(
@@ -33,6 +79,37 @@ def setup_logger():
     file_handler.setFormatter(logging.Formatter(
         "%(asctime)s [%(levelname)s] %(message)s"
     ))
-    logger.addHandler(file_handler)
+    handlers = [console_handler, file_handler]
+
+    # 3. Optional structured output
+    if os.getenv("LOG_JSON", "0") == "1":
+        json_handler = logging.handlers.RotatingFileHandler(
+            filename=os.path.join(LOG_DIR, JSON_LOG_FILE_NAME),
+            maxBytes=5 * 1024 * 1024,
+            backupCount=5,
+            encoding="utf-8"
+        )
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    log_queue = queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", LOG_QUEUE_SIZE)))
+    logger.addHandler(DroppingQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    return logger
+
+def stop_logger():
+    """Flushes queued records and stops the writer thread (safe to call twice)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def dropped_records():
+    logger = logging.getLogger("RBXStalker")
+    return sum(getattr(h, "dropped", 0) for h in logger.handlers)
 
-    return logger
\ No newline at end of file
+atexit.register(stop_logger)
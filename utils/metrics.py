@@ -0,0 +1,170 @@
+import bisect
+import logging
+import re
+import time
+from functools import lru_cache
+
+from aiohttp import web
+
+logger = logging.getLogger("RBXStalker")
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+# Seconds; covers fast DB writes through slow multi-retry API calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+@lru_cache(maxsize=4096)
+def _labels(names, values):
+    if not names: return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+class Gauge:
+    """Value read from `fn()` at scrape time, so nothing is paid between scrapes."""
+
+    def __init__(self, name, help, fn):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            yield f"{self.name} {self.fn()}"
+        except Exception:
+            pass
+
+class Histogram:
+    """Fixed-bucket histogram. observe() is a bisect and three additions;
+    cumulative counts are only computed when scraped."""
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = tuple(buckets)
+        self.series = {} # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [0] * (len(self.buckets) + 2)
+        s[bisect.bisect_left(self.buckets, value)] += 1
+        s[-1] += value
+
+    def time(self, *labels):
+        """`with hist.time("label"):` observes the block's duration."""
+        return _Timer(self, labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, s in self.series.items():
+            names = self.label_names + ("le",)
+            total = 0
+            for bound, count in zip(self.buckets, s):
+                total += count
+                yield f"{self.name}_bucket{_labels(names, labels + (bound,))} {total}"
+            total += s[-2]
+            yield f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {total}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {s[-1]}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {total}"
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn):
+        return self.register(Gauge(name, help, fn))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- Instrumentation points ---
+LOOP_TICK = registry.histogram("rbx_loop_tick_seconds", "Duration of one loop tick.", ("loop",))
+API_LATENCY = registry.histogram("rbx_api_request_seconds", "Roblox API request latency per attempt.", ("endpoint",))
+API_RESPONSES = registry.counter("rbx_api_responses_total", "Roblox API responses by status ('error' for transport failures).", ("endpoint", "status"))
+API_RATE_LIMITED = registry.counter("rbx_api_rate_limited_total", "Roblox API 429 responses.", ("host",))
+API_DROPPED = registry.counter("rbx_api_dropped_total", "Roblox API calls that returned None to the caller.", ("endpoint",))
+DB_WRITE = registry.histogram("rbx_db_write_seconds", "Time holding the SQLite writer (one transaction).")
+DB_FLUSH_ROWS = registry.counter("rbx_db_flushed_rows_total", "Rows written by the write-behind buffer.")
+DISCORD_SEND = registry.histogram("rbx_discord_send_seconds", "Discord send latency (one attempt).", ("kind",))
+DISCORD_FAILURES = registry.counter("rbx_discord_send_failures_total", "Failed Discord send attempts.", ("kind", "reason"))
+DELIVERY_LAG = registry.histogram("rbx_delivery_lag_seconds", "Change detected -> message sent.", ("kind",))
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+@lru_cache(maxsize=1024)
+def endpoint_of(host, path):
+    """Label for a request: host plus path with numeric ids folded, e.g. friends.roblox.com/v1/users/{id}/friends/count."""
+    return f"{host}{_ID_SEGMENT.sub('/{id}', path)}"
+
+class MetricsServer:
+    """Serves the registry as Prometheus text on http://127.0.0.1:<port>/metrics."""
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def handle(self, request):
+        return web.Response(body=registry.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        try:
+            await web.TCPSite(self.runner, self.host, self.port).start()
+            logger.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+        except OSError as e:
+            logger.warning(f"Metrics endpoint disabled, could not bind {self.host}:{self.port}: {e}")
+            await self.stop()
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
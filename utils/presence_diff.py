@@ -0,0 +1,65 @@
+import time
+
+# Roblox userPresenceType values
+OFFLINE, ONLINE, IN_GAME, STUDIO = 0, 1, 2, 3
+
+# Transition kinds
+BECAME_ONLINE = "online"
+BECAME_OFFLINE = "offline"
+JOINED_GAME = "in_game"
+GAME_SWAP = "game_swap"
+IN_STUDIO = "studio"
+
+KIND_BY_TYPE = {OFFLINE: BECAME_OFFLINE, ONLINE: BECAME_ONLINE, IN_GAME: JOINED_GAME, STUDIO: IN_STUDIO}
+
+class Transition:
+    """A detected presence change for one user."""
+    __slots__ = ("kind", "user_id", "presence_type", "previous_type", "place_id", "game_id", "game_name", "detected_at")
+
+    def __init__(self, kind, user_id, presence_type, previous_type, place_id=None, game_id=None, game_name=None, detected_at=None):
+        self.kind = kind
+        self.user_id = user_id
+        self.presence_type = presence_type
+        self.previous_type = previous_type
+        self.place_id = place_id
+        self.game_id = game_id
+        self.game_name = game_name
+        self.detected_at = detected_at
+
+    def __eq__(self, other):
+        return isinstance(other, Transition) and all(getattr(self, f) == getattr(other, f) for f in self.__slots__ if f != "detected_at")
+
+    def __repr__(self):
+        return f"<Transition {self.kind} user={self.user_id} {self.previous_type}->{self.presence_type}>"
+
+def classify(last_type, last_place_id, last_game_id, new_type, new_place_id, new_game_id):
+    """Returns the transition kind for a state change, or None if nothing changed."""
+    if new_type != last_type:
+        return KIND_BY_TYPE.get(new_type)
+    if new_type == IN_GAME and (new_place_id != last_place_id or new_game_id != last_game_id):
+        return GAME_SWAP
+    return None
+
+def diff_presences(users, presences):
+    """Diffs a presence API response against the last known state.
+
+    `users` maps user_id -> record exposing last_presence_type / last_place_id /
+    last_game_id (a TrackedUser, sqlite row or dict). `presences` is the
+    `userPresences` list. Runs in O(len(presences)); presences for unknown users
+    are ignored.
+    """
+    transitions = []
+    now = time.monotonic()
+    for p in presences:
+        uid = p['userId']
+        user = users.get(uid)
+        if user is None: continue
+
+        new_type = p['userPresenceType']
+        new_place_id = p.get("placeId")
+        new_game_id = p.get("gameId")
+        last_type = user['last_presence_type']
+        kind = classify(last_type, user['last_place_id'], user['last_game_id'], new_type, new_place_id, new_game_id)
+        if kind:
+            transitions.append(Transition(kind, uid, new_type, last_type, new_place_id, new_game_id, p.get("lastLocation"), now))
+    return transitions
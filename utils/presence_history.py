@@ -0,0 +1,70 @@
+from utils.presence_diff import OFFLINE, IN_GAME
+
+class Segment:
+    """A stretch of time a user spent in one presence state."""
+    __slots__ = ("start", "end", "presence_type", "place_id", "game_name")
+
+    def __init__(self, start, end, presence_type, place_id=None, game_name=None):
+        self.start = start
+        self.end = end
+        self.presence_type = presence_type
+        self.place_id = place_id
+        self.game_name = game_name
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+def build_segments(prior, events, since, until):
+    """Turns presence_events rows into back-to-back segments clipped to [since, until).
+
+    `prior` is the last event before `since` (or None); the user's state then
+    carries into the window. The final state runs until `until`.
+    """
+    segments = []
+    current = prior
+    start = since
+    for e in events:
+        if current is not None and current['presence_type'] != OFFLINE and e['ts'] > start:
+            segments.append(Segment(start, e['ts'], current['presence_type'], current['place_id'], current['game_name']))
+        current, start = e, max(since, e['ts'])
+    if current is not None and current['presence_type'] != OFFLINE and until > start:
+        segments.append(Segment(start, until, current['presence_type'], current['place_id'], current['game_name']))
+    return segments
+
+def sessions(segments):
+    """Merges touching non-offline segments into sessions: (start, end, [segments])."""
+    result = []
+    for seg in segments:
+        if result and result[-1][1] == seg.start:
+            start, _, parts = result[-1]
+            parts.append(seg)
+            result[-1] = (start, seg.end, parts)
+        else:
+            result.append((seg.start, seg.end, [seg]))
+    return result
+
+def playtime(segments):
+    """Seconds spent per presence type."""
+    totals = {}
+    for seg in segments:
+        totals[seg.presence_type] = totals.get(seg.presence_type, 0) + seg.duration
+    return totals
+
+def top_places(segments, limit=10):
+    """[(place_id, game_name, seconds, visits)] by time spent in game, longest first."""
+    places = {}
+    for seg in segments:
+        if seg.presence_type != IN_GAME: continue
+        name, seconds, visits = places.get(seg.place_id, (None, 0, 0))
+        places[seg.place_id] = (seg.game_name or name, seconds + seg.duration, visits + 1)
+    ranked = sorted(places.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+    return [(place_id, name, seconds, visits) for place_id, (name, seconds, visits) in ranked]
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rem = divmod(seconds, 3600)
+    minutes = rem // 60
+    if hours: return f"{hours}h {minutes}m"
+    if minutes: return f"{minutes}m"
+    return f"{seconds}s"
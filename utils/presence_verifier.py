@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from utils.roblox_api import PRESENCE_BATCH_LIMIT
+
+logger = logging.getLogger("RBXStalker")
+
+VERIFY_DELAY = 2 # seconds a change must hold before it's announced
+VERIFY_BATCH_SIZE = PRESENCE_BATCH_LIMIT
+
+def _target(t):
+    return (t.presence_type, t.place_id, t.game_id)
+
+class PresenceVerifier:
+    """Debounces presence transitions without blocking the polling loops.
+
+    Detected transitions are parked in a pending queue (one per user, newest
+    wins). Once the debounce window has passed, every due user is re-checked
+    with batched presence calls and the transitions that still hold are handed
+    to `on_confirmed(user, transition)`.
+
+    Polls keep seeing the old state until a change is confirmed, so the same
+    transition is usually submitted again: a repeat keeps its original queue
+    time, and repeats for a user whose check is in flight are ignored.
+    """
+
+    def __init__(self, api, on_confirmed, delay=VERIFY_DELAY, batch_size=VERIFY_BATCH_SIZE):
+        self.api = api
+        self.on_confirmed = on_confirmed
+        self.delay = delay
+        self.batch_size = batch_size
+        self.pending = {}
+        self.verifying = {} # user_id -> target state of the transition being checked
+        self.stats = {"queued": 0, "repeats": 0, "confirmed": 0, "rejected": 0, "failed": 0, "batches": 0}
+        self._task = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def submit(self, user, transition):
+        uid, target = transition.user_id, _target(transition)
+        queued = self.pending.get(uid)
+        if self.verifying.get(uid) == target or (queued and _target(queued[1]) == target):
+            self.stats["repeats"] += 1
+            return
+        self.pending[uid] = (user, transition, time.monotonic())
+        self.stats["queued"] += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self.pending.clear()
+        self.verifying.clear()
+
+    async def _run(self):
+        while self.pending:
+            oldest = min(queued_at for _, _, queued_at in self.pending.values())
+            wait = oldest + self.delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            now = time.monotonic()
+            due = {uid: entry for uid, entry in self.pending.items() if entry[2] + self.delay <= now}
+            for uid, (_, t, _) in due.items():
+                del self.pending[uid]
+                self.verifying[uid] = _target(t)
+
+            ids = list(due)
+            for i in range(0, len(ids), self.batch_size):
+                await self._verify({uid: due[uid] for uid in ids[i:i + self.batch_size]})
+
+    async def _verify(self, batch):
+        try:
+            await self._check(batch)
+        finally:
+            for uid, (_, t, _) in batch.items():
+                if self.verifying.get(uid) == _target(t):
+                    del self.verifying[uid]
+
+    async def _check(self, batch):
+        self.stats["batches"] += 1
+        resp = await self.api.get_presences(list(batch))
+        if not resp or "userPresences" not in resp:
+            self.stats["failed"] += len(batch)
+            return
+
+        confirmed = []
+        for p_data in resp['userPresences']:
+            entry = batch.get(p_data['userId'])
+            if not entry: continue
+            user, t, _ = entry
+            if p_data['userPresenceType'] != t.presence_type:
+                self.stats["rejected"] += 1
+                continue
+
+            t.game_name = p_data.get("lastLocation") or t.game_name
+            self.stats["confirmed"] += 1
+            confirmed.append((user, t))
+
+        # Handled concurrently so one slow announcement doesn't hold up the batch
+        await asyncio.gather(*(self._confirm(user, t) for user, t in confirmed))
+
+    async def _confirm(self, user, t):
+        try:
+            await self.on_confirmed(user, t)
+        except Exception as e:
+            logger.error(f"Failed to handle transition for {t.user_id}: {e}")
@@ -0,0 +1,184 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from utils.metrics import LOOP_TICK, registry
+
+logger = logging.getLogger("RBXStalker")
+
+LAG_THRESHOLD = 0.25 # seconds the event loop may stall before the stack is logged
+LAG_CHECK_INTERVAL = 0.1
+SAMPLE_INTERVAL = 0.005 # seconds between stack samples
+PROFILE_MAX_SECONDS = 840 # hard stop; stays under the 15 min slash-command token lifetime
+STACK_DEPTH = 40
+
+LOOP_LAG = registry.histogram("rbx_event_loop_lag_seconds", "Event loop scheduling delay.",
+                              buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+def _frame_key(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _stack(frame, depth=STACK_DEPTH):
+    """Outermost-first list of frame labels."""
+    stack = []
+    while frame is not None and len(stack) < depth:
+        stack.append(_frame_key(frame))
+        frame = frame.f_back
+    return stack[::-1]
+
+class LoopLagMonitor:
+    """Always-on event loop stall detector.
+
+    A coroutine ticks a heartbeat every LAG_CHECK_INTERVAL and records how late
+    it woke up. A watchdog thread watches the heartbeat; once the loop has been
+    stuck past the threshold it captures the loop thread's current stack (the
+    code that is blocking) and logs it once per stall.
+    """
+
+    def __init__(self, threshold=LAG_THRESHOLD, interval=LAG_CHECK_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.heartbeat = time.monotonic()
+        self.loop_thread = None
+        self.stats = {"stalls": 0, "worst": 0.0}
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task: return
+        self.loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            LOOP_LAG.observe(lag)
+            self.heartbeat = now
+            if lag > self.stats["worst"]: self.stats["worst"] = lag
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.interval):
+            beat = self.heartbeat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or reported == beat: continue
+            reported = beat
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None: continue
+            self.stats["stalls"] += 1
+            stack = "".join(traceback.format_stack(frame, limit=15))
+            logger.warning(f"Event loop blocked for {stalled:.2f}s+; running:\n{stack}", extra={"latency": round(stalled, 3)})
+
+class StackSampler:
+    """Samples the event loop thread's stack from a helper thread; output is
+    collapsed stacks ("a;b;c count"), which flamegraph tools read directly."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None: continue
+            key = ";".join(_stack(frame))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def report(self, top=40):
+        own = {}
+        for stack, count in self.counts.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            own[leaf] = own.get(leaf, 0) + count
+        lines = [f"{self.samples} samples every {self.interval * 1000:.0f}ms", "", "Top frames (self samples):"]
+        for leaf, count in sorted(own.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+            lines.append(f"{count:>7} {100 * count / max(1, self.samples):5.1f}%  {leaf}")
+        return "\n".join(lines)
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.counts.items()))
+
+async def wait_for_ticks(loop_name, ticks, timeout=PROFILE_MAX_SECONDS):
+    """Waits until `loop_name` has finished `ticks` more ticks (per the metrics histogram).
+    Returns the number of ticks seen, which is less than asked if the timeout hit."""
+    def count():
+        series = LOOP_TICK.series.get((loop_name,))
+        return sum(series[:-1]) if series else 0
+    start, deadline = count(), time.monotonic() + timeout
+    while count() - start < ticks and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return count() - start
+
+async def profile(mode, loop_name=None, ticks=5, seconds=30):
+    """Profiles the event loop thread for `ticks` ticks of `loop_name`, or for
+    `seconds`. Returns (summary, [(filename, bytes)])."""
+    start = time.monotonic()
+    if mode == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+    else:
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+    try:
+        if loop_name:
+            seen = await wait_for_ticks(loop_name, ticks)
+            scope = f"{seen}/{ticks} ticks of `{loop_name}`"
+        else:
+            await asyncio.sleep(seconds)
+            scope = f"{seconds}s window"
+    finally:
+        if mode == "cprofile":
+            prof.disable()
+        else:
+            await asyncio.to_thread(sampler.stop)
+    elapsed = time.monotonic() - start
+    summary = f"{scope} in {elapsed:.1f}s"
+
+    if mode == "cprofile":
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(60)
+        with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as f:
+            path = f.name
+        try:
+            prof.dump_stats(path)
+            with open(path, "rb") as f:
+                raw = f.read()
+        finally:
+            os.remove(path)
+        return summary, [("profile.txt", out.getvalue().encode("utf-8")), ("profile.prof", raw)]
+    return summary, [("profile.txt", sampler.report().encode("utf-8")),
+                     ("profile.collapsed.txt", sampler.collapsed().encode("utf-8"))]
@@ -0,0 +1,76 @@
+import asyncio
+import heapq
+import random
+import time
+
+# Request priorities (lower goes first when a bucket is contended)
+PRIORITY_PRESENCE = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_METADATA = 2
+
+def backoff_delay(attempt, base=1.0, cap=30.0, floor=0.0):
+    """Exponential backoff with full jitter, never shorter than `floor` (e.g. Retry-After)."""
+    return max(floor, random.uniform(0, min(cap, base * 2 ** attempt)))
+
+class TokenBucket:
+    """Token bucket whose waiters are served by priority, then arrival order.
+
+    `block_for()` pauses the bucket entirely, which is how Retry-After and
+    exhausted rate-limit headers are honoured.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiters = []
+        self._seq = 0
+        self._drainer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def block_for(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def wait_time(self):
+        """Seconds until a token would be available to a new caller (0 if one is now)."""
+        now = self._refill()
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1 or self.waiters:
+            wait = max(wait, (1 + len(self.waiters) - self.tokens) / self.rate)
+        return wait
+
+    async def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """Waits for a token. Returns True if the caller had to wait (was throttled)."""
+        now = self._refill()
+        if not self.waiters and self.tokens >= 1 and now >= self.blocked_until:
+            self.tokens -= 1
+            return False
+
+        fut = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self.waiters, (priority, self._seq, fut))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        await fut
+        return True
+
+    async def _drain(self):
+        while self.waiters:
+            now = self._refill()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, fut = heapq.heappop(self.waiters)
+            if fut.done(): continue # caller was cancelled
+            self.tokens -= 1
+            fut.set_result(None)
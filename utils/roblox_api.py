@@ -2,33 +2,184 @@ import aiohttp
 import asyncio
 import logging
 import os
+import time
+from urllib.parse import urlsplit
+from utils.cache import TTLCache
+from utils.metrics import API_LATENCY, API_RESPONSES, API_RATE_LIMITED, API_DROPPED, endpoint_of
+from utils.rate_limit import (TokenBucket, backoff_delay, PRIORITY_PRESENCE,
+                              PRIORITY_INTERACTIVE, PRIORITY_METADATA)
 
 logger = logging.getLogger("RBXStalker")
 
+PRESENCE_BATCH_LIMIT = 50 # max userIds per presence/users call
+THUMBNAIL_BATCH_LIMIT = 100 # max userIds per thumbnails call
+USERS_BATCH_LIMIT = 100 # max ids/usernames per users lookup
+THUMBNAIL_PENDING_RETRIES = 2
+THUMBNAIL_PENDING_DELAY = 3 # seconds before re-checking "Pending" thumbnails
+
+# (requests per second, burst) per host. Kept under Roblox's per-IP limits.
+HOST_LIMITS = {
+    "presence.roblox.com": (2, 4),
+    "users.roblox.com": (3, 6),
+    "friends.roblox.com": (3, 6),
+    "groups.roblox.com": (3, 6),
+    "thumbnails.roblox.com": (5, 10),
+    "games.roblox.com": (3, 6),
+}
+DEFAULT_HOST_LIMIT = (3, 6)
+MAX_RETRIES = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+SERVER_INFO_TTL = 30 # seconds; player counts go stale quickly
+SERVER_INFO_NEGATIVE_TTL = 300 # private/unavailable servers
+SERVER_INFO_CACHE_SIZE = 512
+
+# Connection pooling for the shared session (overridable via .env)
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", 100))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", 10))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", 60)) # seconds an idle connection is kept
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", 300))
+
+class APIUnavailable(Exception):
+    """A request failed for transient reasons (as opposed to "not found")."""
+
+def _header_seconds(headers, name):
+    try:
+        return max(0.0, float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
 class RobloxAPI:
+    """HTTP client shared by the whole bot (see RBXStalkerBot.api).
+
+    Owns one pooled aiohttp session that is also used for non-Roblox calls such
+    as webhooks; the .ROBLOSECURITY cookie is only attached to roblox.com hosts.
+    """
+
     def __init__(self):
         self.session = None
         self.cookie = os.getenv("ROBLOSECURITY")
+        # Points every *.roblox.com call at a stand-in server (benchmarks/load_test.py)
+        self.base_url = os.getenv("ROBLOX_API_BASE")
+        self.buckets = {}
+        self.stats = {}
+        self.connections = {}
+        self.server_cache = TTLCache(SERVER_INFO_CACHE_SIZE, SERVER_INFO_TTL, SERVER_INFO_NEGATIVE_TTL)
 
     async def get_session(self):
-        if self.session is None:
-            headers = {}
-            if self.cookie:
-                headers["Cookie"] = f".ROBLOSECURITY={self.cookie}"
-            self.session = aiohttp.ClientSession(headers=headers)
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_LIMIT, limit_per_host=HTTP_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE, ttl_dns_cache=HTTP_DNS_TTL, use_dns_cache=True
+            )
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
         return self.session
 
-    async def request(self, method, url, **kwargs):
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    # --- CONNECTION REUSE METRICS ---
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+
+        async def on_connection_create_end(session, ctx, params):
+            self._count_connection(getattr(ctx, "host", None), "created")
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self._count_connection(getattr(ctx, "host", None), "reused")
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    def _count_connection(self, host, key):
+        host_conns = self.connections.setdefault(host or "unknown", {"created": 0, "reused": 0})
+        host_conns[key] += 1
+
+    def reuse_ratio(self, host=None):
+        hosts = [self.connections.get(host, {})] if host else self.connections.values()
+        created = sum(h.get("created", 0) for h in hosts)
+        reused = sum(h.get("reused", 0) for h in hosts)
+        return reused / (created + reused) if created + reused else 0.0
+
+    # --- REQUEST GOVERNOR ---
+    def _bucket(self, host):
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(*HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+        return self.buckets[host]
+
+    def _count(self, host, key):
+        host_stats = self.stats.setdefault(host, {"requests": 0, "throttled": 0, "retried": 0, "dropped": 0})
+        host_stats[key] += 1
+
+    def totals(self):
+        total = {"requests": 0, "throttled": 0, "retried": 0, "dropped": 0}
+        for host_stats in self.stats.values():
+            for key, value in host_stats.items():
+                total[key] += value
+        return total
+
+    def _apply_limit_headers(self, bucket, headers):
+        # Roblox sends x-ratelimit-remaining / x-ratelimit-reset on most endpoints
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = _header_seconds(headers, "x-ratelimit-reset")
+        if remaining is not None and reset is not None and remaining.strip() == "0":
+            bucket.block_for(reset)
+
+    async def request(self, method, url, priority=PRIORITY_INTERACTIVE, **kwargs):
         session = await self.get_session()
-        try:
-            async with session.request(method, url, **kwargs) as response:
-                if response.status == 429:
-                    logger.warning(f"Rate Limit (429) at {url}. Skipping.")
-                    return None
-                if response.status == 200:
-                    return await response.json()
-        except Exception as e:
-            logger.error(f"API Error at {url}: {e}")
+        parts = urlsplit(url)
+        host = parts.hostname
+        endpoint = endpoint_of(host, parts.path)
+        bucket = self._bucket(host)
+        if self.base_url:
+            # https://<sub>.roblox.com/<path> -> <base>/<sub>/<path>; host-level limits and stats are kept
+            url = f"{self.base_url.rstrip('/')}/{host.split('.')[0]}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        elif self.cookie and host and host.endswith("roblox.com"):
+            kwargs["headers"] = {**kwargs.get("headers", {}), "Cookie": f".ROBLOSECURITY={self.cookie}"}
+
+        for attempt in range(MAX_RETRIES + 1):
+            if await bucket.acquire(priority):
+                self._count(host, "throttled")
+            self._count(host, "requests")
+            retry_after = None
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    API_LATENCY.observe(time.perf_counter() - start, endpoint)
+                    API_RESPONSES.inc(endpoint, response.status)
+                    self._apply_limit_headers(bucket, response.headers)
+                    if response.status == 200:
+                        return await response.json()
+                    if response.status not in RETRY_STATUSES:
+                        API_DROPPED.inc(endpoint)
+                        return None
+                    retry_after = _header_seconds(response.headers, "Retry-After")
+                    if response.status == 429:
+                        API_RATE_LIMITED.inc(host)
+                        # Pause every caller of this host, not just this one
+                        bucket.block_for(retry_after or backoff_delay(attempt))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                API_RESPONSES.inc(endpoint, "error")
+                logger.warning(f"API Error at {url} (attempt {attempt + 1}): {e}")
+            except Exception as e:
+                API_RESPONSES.inc(endpoint, "error")
+                API_DROPPED.inc(endpoint)
+                logger.error(f"API Error at {url}: {e}")
+                return None
+
+            if attempt == MAX_RETRIES: break
+            self._count(host, "retried")
+            await asyncio.sleep(backoff_delay(attempt, floor=retry_after or 0))
+
+        self._count(host, "dropped")
+        API_DROPPED.inc(endpoint)
+        logger.warning(f"Dropped request to {url} after {MAX_RETRIES} retries.")
         return None
 
     # --- USER DATA ---
@@ -40,27 +191,107 @@ class RobloxAPI:
                                     json={"usernames": [user_input], "excludeBannedUsers": True})
             return data["data"][0] if data and data.get("data") else None
 
+    async def resolve_users(self, identifiers):
+        """Resolves many usernames/IDs at once.
+
+        Numeric identifiers are looked up through the multi-user endpoint (and
+        retried as usernames if no such ID exists), names through usernames/users,
+        both in batches of USERS_BATCH_LIMIT. Returns [{id, name, displayName}]
+        in input order, without duplicates or unknown users.
+        """
+        idents = list(dict.fromkeys(str(i).strip() for i in identifiers if str(i).strip()))
+        ids = [int(i) for i in idents if i.isdigit()]
+        names = [i for i in idents if not i.isdigit()]
+
+        def chunked(items):
+            return [items[i:i + USERS_BATCH_LIMIT] for i in range(0, len(items), USERS_BATCH_LIMIT)]
+
+        async def lookup_ids(chunk):
+            return await self.request("POST", "https://users.roblox.com/v1/users",
+                                      json={"userIds": chunk, "excludeBannedUsers": True})
+
+        async def lookup_names(chunk):
+            return await self.request("POST", "https://users.roblox.com/v1/usernames/users",
+                                      json={"usernames": chunk, "excludeBannedUsers": True})
+
+        by_id, by_name = {}, {}
+        for data in await asyncio.gather(*map(lookup_ids, chunked(ids))):
+            for u in (data or {}).get("data", []):
+                by_id[str(u['id'])] = u
+
+        names += [i for i in idents if i.isdigit() and i not in by_id]
+        for data in await asyncio.gather(*map(lookup_names, chunked(names))):
+            for u in (data or {}).get("data", []):
+                by_name[u.get("requestedUsername", u['name']).lower()] = u
+
+        resolved = {}
+        for ident in idents:
+            u = by_id.get(ident) or by_name.get(ident.lower())
+            if u and u['id'] not in resolved:
+                resolved[u['id']] = {"id": u['id'], "name": u['name'], "displayName": u.get("displayName") or u['name']}
+        return list(resolved.values())
+
     async def get_presences(self, user_ids):
-        return await self.request("POST", "https://presence.roblox.com/v1/presence/users", json={"userIds": user_ids})
+        return await self.request("POST", "https://presence.roblox.com/v1/presence/users", json={"userIds": user_ids},
+                                  priority=PRIORITY_PRESENCE)
 
     async def get_friends(self, user_id):
-        return await self.request("GET", f"https://friends.roblox.com/v1/users/{user_id}/friends")
+        return await self.request("GET", f"https://friends.roblox.com/v1/users/{user_id}/friends", priority=PRIORITY_METADATA)
+
+    async def get_friend_count(self, user_id):
+        data = await self.request("GET", f"https://friends.roblox.com/v1/users/{user_id}/friends/count", priority=PRIORITY_METADATA)
+        return data.get("count") if data else None
 
     async def get_avatar(self, user_id):
-        data = await self.request("GET", f"https://thumbnails.roblox.com/v1/users/avatar-headshot?userIds={user_id}&size=420x420&format=Png&isCircular=false")
-        return data["data"][0].get("imageUrl") if data and data.get("data") else None
+        return (await self.get_avatars([user_id])).get(int(user_id))
+
+    async def get_avatars(self, user_ids):
+        """Returns {user_id: imageUrl} for every headshot that is ready.
+
+        Thumbnails still being rendered ("Pending") are re-checked after a short
+        delay and left out if they never complete, so no placeholder gets saved.
+        """
+        avatars = {}
+        pending = list(dict.fromkeys(int(uid) for uid in user_ids))
+        for attempt in range(THUMBNAIL_PENDING_RETRIES + 1):
+            if attempt: await asyncio.sleep(THUMBNAIL_PENDING_DELAY)
+            chunks = [pending[i:i + THUMBNAIL_BATCH_LIMIT] for i in range(0, len(pending), THUMBNAIL_BATCH_LIMIT)]
+            responses = await asyncio.gather(*(
+                self.request("GET", "https://thumbnails.roblox.com/v1/users/avatar-headshot"
+                             f"?userIds={','.join(map(str, chunk))}&size=420x420&format=Png&isCircular=false",
+                             priority=PRIORITY_METADATA)
+                for chunk in chunks
+            ))
+            pending = []
+            for data in responses:
+                for item in (data or {}).get("data", []):
+                    if item.get("state") == "Completed" and item.get("imageUrl"):
+                        avatars[item['targetId']] = item['imageUrl']
+                    elif item.get("state") == "Pending":
+                        pending.append(item['targetId'])
+            if not pending: break
+        return avatars
 
     # --- NEW METADATA ---
     async def get_socials(self, user_id):
-        return await self.request("GET", f"https://users.roblox.com/v1/users/{user_id}/social-links")
+        return await self.request("GET", f"https://users.roblox.com/v1/users/{user_id}/social-links", priority=PRIORITY_METADATA)
 
     async def get_user_groups(self, user_id):
-        return await self.request("GET", f"https://groups.roblox.com/v1/users/{user_id}/groups/roles")
+        return await self.request("GET", f"https://groups.roblox.com/v1/users/{user_id}/groups/roles", priority=PRIORITY_METADATA)
 
     # --- GAME INFO ---
     async def get_server_info(self, place_id, game_id):
+        """Cached per (place_id, game_id); private/unknown servers are negatively cached."""
+        try:
+            return await self.server_cache.get((place_id, game_id), lambda: self._fetch_server_info(place_id, game_id))
+        except APIUnavailable:
+            return None
+
+    async def _fetch_server_info(self, place_id, game_id):
         data = await self.request("GET", f"https://games.roblox.com/v1/games/{place_id}/servers/Public?serverId={game_id}")
-        if data and "data" in data and len(data["data"]) > 0:
+        if data is None:
+            raise APIUnavailable(f"server info for {place_id}/{game_id}")
+        if "data" in data and len(data["data"]) > 0:
             s = data["data"][0]
             return {
                 "playing": s.get("playing", "?"),
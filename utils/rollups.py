@@ -0,0 +1,89 @@
+import datetime
+from functools import lru_cache
+
+from utils.presence_diff import OFFLINE, IN_GAME
+
+@lru_cache(maxsize=4096)
+def _day_key(day_number):
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=day_number)).isoformat()
+
+def day_of(ts):
+    """UTC day key ('YYYY-MM-DD') for a unix timestamp."""
+    return _day_key(int(ts // 86400))
+
+def split_by_day(start, end):
+    """Splits [start, end) at UTC midnights: [(day, seconds), ...]."""
+    parts = []
+    while start < end:
+        midnight = (start // 86400 + 1) * 86400
+        stop = min(end, midnight)
+        parts.append((day_of(start), stop - start))
+        start = stop
+    return parts
+
+class RollupAccumulator:
+    """Turns a stream of presence events into rollup deltas.
+
+    Each event closes the user's previous state: its duration is split across
+    UTC days and added to `daily[(user_id, day, presence_type)]`, and in-game
+    time also to `places[(user_id, day, place_id)] = [joins, seconds, name]`.
+    Joining a place counts one join on the day of the event. The user's
+    latest state stays open (kept in `last`) until their next event, which is
+    why live and rebuilt rollups agree. Events must arrive in time order per
+    user; a late one adds no time here and is only placed correctly by a rebuild.
+    """
+
+    def __init__(self):
+        self.last = {} # user_id -> (ts, presence_type, place_id, game_name)
+        self.daily = {}
+        self.places = {}
+
+    def __len__(self):
+        return len(self.daily) + len(self.places)
+
+    def record(self, user_id, ts, presence_type, place_id, game_name):
+        prev = self.last.get(user_id)
+        if prev and ts > prev[0] and prev[1] != OFFLINE:
+            prev_ts, prev_type, prev_place, prev_name = prev
+            for day, seconds in split_by_day(prev_ts, ts):
+                key = (user_id, day, prev_type)
+                self.daily[key] = self.daily.get(key, 0) + seconds
+                if prev_type == IN_GAME and prev_place:
+                    self._place(user_id, day, prev_place, prev_name)[1] += seconds
+        if presence_type == IN_GAME and place_id:
+            self._place(user_id, day_of(ts), place_id, game_name)[0] += 1
+        if not prev or ts >= prev[0]:
+            self.last[user_id] = (ts, presence_type, place_id, game_name)
+
+    def _place(self, user_id, day, place_id, game_name):
+        entry = self.places.get((user_id, day, place_id))
+        if entry is None:
+            entry = self.places[(user_id, day, place_id)] = [0, 0, game_name]
+        elif game_name:
+            entry[2] = game_name
+        return entry
+
+    def drain(self):
+        """Returns and clears the pending (daily, places) deltas."""
+        daily, places = self.daily, self.places
+        self.daily, self.places = {}, {}
+        return daily, places
+
+    def restore(self, daily, places):
+        """Adds drained deltas back (after a failed write), merged with any recorded since."""
+        for key, seconds in daily.items():
+            self.daily[key] = self.daily.get(key, 0) + seconds
+        for key, (joins, seconds, name) in places.items():
+            entry = self.places.get(key)
+            if entry is None:
+                self.places[key] = [joins, seconds, name]
+            else:
+                entry[0] += joins
+                entry[1] += seconds
+                entry[2] = entry[2] or name
+
+    def open_segment(self, user_id, now):
+        """The user's current, not yet rolled-up state as [(day, seconds)] (empty if offline)."""
+        prev = self.last.get(user_id)
+        if not prev or prev[1] == OFFLINE: return prev, []
+        return prev, split_by_day(prev[0], now)
@@ -0,0 +1,137 @@
+import heapq
+import time
+from utils.roblox_api import PRESENCE_BATCH_LIMIT
+
+DEFAULT_TIERS = "0:35,1:10" # priority tier -> seconds between checks
+BATCHES_PER_SECOND = 1
+LOOKAHEAD_FRACTION = 0.25 # how early a user may be pulled in to fill a batch
+
+def parse_tiers(spec):
+    """Parses "tier:seconds,tier:seconds" (e.g. the TRACKING_TIERS env var)."""
+    tiers = {}
+    for part in (spec or DEFAULT_TIERS).split(","):
+        if ":" not in part: continue
+        tier, seconds = part.split(":", 1)
+        tiers[int(tier)] = max(1.0, float(seconds))
+    return tiers or parse_tiers(DEFAULT_TIERS)
+
+class LagStats:
+    """How late checks ran compared to when they were due, per tier."""
+    __slots__ = ("count", "total", "worst", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.last = 0.0
+
+    def record(self, lag):
+        self.count += 1
+        self.total += lag
+        self.last = lag
+        if lag > self.worst: self.worst = lag
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+class PresenceScheduler:
+    """Deadline scheduler for presence checks.
+
+    Every tracked user has a next-due time derived from its tier interval. Each
+    tick pops the due users, tops the last batch up with users that are due
+    soon so batches go out full, and hands back at most `rate` batches.
+    """
+
+    def __init__(self, store, tiers, batch_size=PRESENCE_BATCH_LIMIT, rate=BATCHES_PER_SECOND):
+        self.store = store
+        self.tiers = tiers
+        self.batch_size = batch_size
+        self.rate = rate
+        self.heap = []
+        self.due_at = {}
+        self.seq_of = {}
+        self.tier_of = {}
+        self.lag = {tier: LagStats() for tier in tiers}
+        self._version = None
+        self._seq = 0
+
+    def interval(self, tier):
+        return self.tiers.get(tier, self.tiers.get(0, max(self.tiers.values())))
+
+    def _push(self, uid, due):
+        # Older heap entries for uid become stale and are skipped when popped
+        self._seq += 1
+        self.due_at[uid] = due
+        self.seq_of[uid] = self._seq
+        heapq.heappush(self.heap, (due, self._seq, uid))
+
+    def sync(self, now=None):
+        """Picks up added/removed users and tier changes from the store."""
+        if self._version == self.store.version: return
+        self._version = self.store.version
+        now = time.monotonic() if now is None else now
+
+        for uid in [uid for uid in self.due_at if uid not in self.store]:
+            del self.due_at[uid]
+            del self.seq_of[uid]
+            del self.tier_of[uid]
+
+        new_users = []
+        for user in self.store.all():
+            uid = user.user_id
+            tier = user.priority or 0
+            if uid not in self.due_at:
+                new_users.append(user)
+            elif self.tier_of[uid] != tier:
+                self._push(uid, min(self.due_at[uid], now + self.interval(tier)))
+            self.tier_of[uid] = tier
+
+        # Spread newcomers over their first interval instead of one burst
+        for i, user in enumerate(new_users):
+            interval = self.interval(self.tier_of[user.user_id])
+            self._push(user.user_id, now + interval * i / len(new_users))
+
+    def _pop(self, limit):
+        while self.heap and self.heap[0][0] <= limit:
+            due, seq, uid = heapq.heappop(self.heap)
+            if self.seq_of.get(uid) == seq:
+                return uid, due
+        return None
+
+    def next_batches(self, now=None):
+        """Returns up to `rate` batches of users to check now and reschedules them."""
+        now = time.monotonic() if now is None else now
+        self.sync(now)
+
+        batches = []
+        lookahead = now + min(self.tiers.values()) * LOOKAHEAD_FRACTION
+        while len(batches) < self.rate:
+            batch = []
+            while len(batch) < self.batch_size:
+                # Due users first, then early ones only to fill a partially packed batch
+                item = self._pop(now) or (self._pop(lookahead) if batch else None)
+                if not item: break
+                uid, due = item
+                user = self.store.get(uid)
+                if not user: continue
+                tier = self.tier_of.get(uid, 0)
+                self.lag.setdefault(tier, LagStats()).record(max(0.0, now - due))
+                self._push(uid, now + self.interval(tier))
+                batch.append(user)
+            if not batch: break
+            batches.append(batch)
+        return batches
+
+    def backlog(self, now=None):
+        """Number of users that are already overdue."""
+        now = time.monotonic() if now is None else now
+        return sum(1 for due in self.due_at.values() if due <= now)
+
+    def report(self):
+        counts = {}
+        for tier in self.tier_of.values():
+            counts[tier] = counts.get(tier, 0) + 1
+        return {tier: {"users": counts.get(tier, 0), "interval": self.interval(tier),
+                       "avg_lag": stats.average, "max_lag": stats.worst, "last_lag": stats.last}
+                for tier, stats in sorted(self.lag.items())}
@@ -0,0 +1,125 @@
+from database import get_all_tracked_users, add_user_to_track, add_users_to_track, remove_user_track, writes
+
+TRACKED_FIELDS = ("user_id", "username", "display_name", "ping_mode", "priority",
+                  "last_presence_type", "last_game_name", "last_avatar_url", "enabled",
+                  "last_place_id", "last_game_id")
+
+class TrackedUser:
+    """One row of tracked_users kept in memory. Supports user['field'] like the old sqlite rows."""
+    __slots__ = TRACKED_FIELDS
+
+    def __init__(self, **fields):
+        for name in TRACKED_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_row(cls, row):
+        keys = row.keys()
+        return cls(**{name: row[name] for name in TRACKED_FIELDS if name in keys})
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"<TrackedUser {self.user_id} @{self.username}>"
+
+class UserStore:
+    """Authoritative in-process copy of the enabled tracked users.
+
+    Loaded once at startup; every mutation updates memory first and then writes
+    through to SQLite, so the tracking loops never need to read the table.
+    Adds and removes are written immediately, field and presence updates go
+    through the write-behind buffer.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.by_priority = {}
+        # Bumped whenever membership or a user's priority tier changes
+        self.version = 0
+        self.loaded = False
+
+    async def load(self):
+        self.users = {}
+        self.by_priority = {}
+        for row in await get_all_tracked_users():
+            self._index(TrackedUser.from_row(row))
+        self.loaded = True
+
+    def _index(self, user):
+        self.version += 1
+        self.users[user.user_id] = user
+        self.by_priority.setdefault(user.priority or 0, {})[user.user_id] = user
+
+    def _unindex(self, user_id):
+        user = self.users.pop(user_id, None)
+        if user:
+            self.version += 1
+            self.by_priority.get(user.priority or 0, {}).pop(user_id, None)
+        return user
+
+    # --- READS (never touch the disk) ---
+    def get(self, user_id):
+        return self.users.get(user_id)
+
+    def all(self):
+        return list(self.users.values())
+
+    def with_priority(self, priority):
+        return list(self.by_priority.get(priority, {}).values())
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, user_id):
+        return user_id in self.users
+
+    # --- WRITES (memory first, then SQLite) ---
+    async def add(self, user_id, username, display_name, ping_mode='ping', priority=0):
+        self._unindex(user_id)
+        user = TrackedUser(user_id=user_id, username=username, display_name=display_name,
+                           ping_mode=ping_mode, priority=priority, last_presence_type=0, enabled=1)
+        self._index(user)
+        writes.discard(user_id)
+        await add_user_to_track(user_id, username, display_name, ping_mode, priority)
+        return user
+
+    async def add_many(self, users, ping_mode='ping', priority=0):
+        """Adds resolved users ({id, name, displayName, avatar_url}) in one transaction."""
+        added = []
+        for u in users:
+            self._unindex(u['id'])
+            writes.discard(u['id'])
+            user = TrackedUser(user_id=u['id'], username=u['name'], display_name=u['displayName'], ping_mode=ping_mode,
+                               priority=priority, last_presence_type=0, last_avatar_url=u.get('avatar_url'), enabled=1)
+            self._index(user)
+            added.append(user)
+        await add_users_to_track(users, ping_mode, priority)
+        return added
+
+    async def remove(self, user_id):
+        user = self._unindex(user_id)
+        writes.discard(user_id)
+        await remove_user_track(user_id)
+        return user
+
+    async def set_field(self, user_id, field, value):
+        if field not in TRACKED_FIELDS or field == "user_id":
+            raise ValueError(f"Unknown tracked_users field: {field}")
+        user = self.users.get(user_id)
+        if user:
+            if field in ("priority", "enabled"):
+                self._unindex(user_id)
+                setattr(user, field, value)
+                if user.enabled: self._index(user)
+            else:
+                setattr(user, field, value)
+        writes.queue_user_field(user_id, field, value)
+
+    async def set_presence(self, user_id, presence_type, place_id, game_id):
+        user = self.users.get(user_id)
+        if user:
+            user.last_presence_type = presence_type
+            user.last_place_id = place_id
+            user.last_game_id = game_id
+        writes.queue_presence(user_id, presence_type, place_id, game_id)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from utils.delivery import PermanentDeliveryError
+
+WEBHOOK_BATCH_WINDOW = 1.0 # seconds to collect embeds for one webhook message
+WEBHOOK_MAX_EMBEDS = 10 # Discord's per-message limit
+
+class WebhookRateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Webhook rate limited for {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+class WebhookBatcher:
+    """Coalesces events per webhook URL into messages of up to 10 embeds.
+
+    Embeds are collected for a short window (or until 10 are waiting), then
+    handed to the delivery queue as a single post over the shared HTTP session.
+    Discord's X-RateLimit-* headers are tracked per bucket so a drained bucket
+    is waited out instead of hammered into 429s.
+    """
+
+    def __init__(self, api, delivery, window=WEBHOOK_BATCH_WINDOW):
+        self.api = api
+        self.delivery = delivery
+        self.window = window
+        self.username = "RBXStalker Event"
+        self.avatar_url = None
+        self.buffers = {}
+        self.timers = {}
+        self.bucket_of = {} # url -> X-RateLimit-Bucket
+        self.limits = {} # bucket -> (remaining, resets_at)
+        self.stats = {"embeds": 0, "posts": 0, "rate_limited": 0}
+
+    def add(self, url, embed, detected_at=None):
+        buf = self.buffers.setdefault(url, [])
+        buf.append((embed.to_dict(), detected_at))
+        self.stats["embeds"] += 1
+        if len(buf) >= WEBHOOK_MAX_EMBEDS:
+            self._flush(url)
+        elif url not in self.timers:
+            self.timers[url] = asyncio.get_running_loop().call_later(self.window, self._flush, url)
+
+    def _flush(self, url):
+        timer = self.timers.pop(url, None)
+        if timer: timer.cancel()
+        buf = self.buffers.pop(url, [])
+        for i in range(0, len(buf), WEBHOOK_MAX_EMBEDS):
+            chunk = buf[i:i + WEBHOOK_MAX_EMBEDS]
+            embeds = [e for e, _ in chunk]
+            detected = min((d for _, d in chunk if d), default=None)
+            self.delivery.enqueue(("webhook", url), lambda embeds=embeds: self._post(url, embeds), detected)
+
+    def flush_all(self):
+        for url in list(self.buffers):
+            self._flush(url)
+
+    async def _post(self, url, embeds):
+        bucket = self.bucket_of.get(url)
+        if bucket in self.limits:
+            remaining, resets_at = self.limits[bucket]
+            if remaining <= 0 and resets_at > time.monotonic():
+                await asyncio.sleep(resets_at - time.monotonic())
+
+        session = await self.api.get_session()
+        payload = {"embeds": embeds, "username": self.username, "avatar_url": self.avatar_url}
+        async with session.post(url, json=payload) as resp:
+            self._track_limits(url, resp.headers)
+            if resp.status == 429:
+                self.stats["rate_limited"] += 1
+                body = await resp.json(content_type=None)
+                raise WebhookRateLimited(float((body or {}).get("retry_after") or resp.headers.get("Retry-After") or 1))
+            if resp.status in (401, 403, 404):
+                raise PermanentDeliveryError(f"Webhook rejected ({resp.status})")
+            resp.raise_for_status()
+        self.stats["posts"] += 1
+
+    def _track_limits(self, url, headers):
+        bucket = headers.get("X-RateLimit-Bucket")
+        if not bucket: return
+        self.bucket_of[url] = bucket
+        try:
+            remaining = int(headers.get("X-RateLimit-Remaining", 1))
+            reset_after = float(headers.get("X-RateLimit-Reset-After", 0))
+        except ValueError:
+            return
+        self.limits[bucket] = (remaining, time.monotonic() + reset_after)